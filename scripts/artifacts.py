@@ -0,0 +1,91 @@
+"""
+Content addressed cache of typst outputs: the key is the input digest of an article (inputs plus typst version)
+and the output mode, the value the final svg set. Entries are stored as <root>/<key[:2]>/<key>/ and evicted
+least recently used first once the cache grows past its size limit, the cache dir can be shared between
+checkouts or saved between CI runs.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+CACHE_DIR = Path(os.environ.get("BUILDTYP_CACHE_DIR", ".cache/buildtyp/artifacts"))
+CACHE_SIZE = 512 << 20
+# touched on every hit, its mtime orders the entries for eviction
+STAMP = ".used"
+
+class ArtifactCache:
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = CACHE_SIZE):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str, dest_dir: Path) -> Optional[List[Path]]:
+        """
+        Copy the cached outputs of `key` into `dest_dir`, return them or None on a miss
+        """
+        entry = self.entry(key)
+        stamp = entry / STAMP
+        if not stamp.exists():
+            return None
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        restored = []
+        for src in sorted(entry.iterdir()):
+            if src.name == STAMP:
+                continue
+            dst = dest_dir / src.name
+            # keep files whose content already matches untouched, like a compilation writing the same bytes would not
+            if not (dst.exists() and dst.stat().st_size == src.stat().st_size and dst.read_bytes() == src.read_bytes()):
+                shutil.copyfile(src, dst)
+            restored.append(dst)
+        stamp.touch()
+        return restored
+
+    def put(self, key: str, files: Iterable[Path]) -> None:
+        """
+        Store a copy of `files` under `key`, the entry appears atomically
+        """
+        entry = self.entry(key)
+        if (entry / STAMP).exists():
+            (entry / STAMP).touch()
+            self.evict()
+            return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=entry.parent, prefix=f".{key}."))
+        try:
+            for f in files:
+                shutil.copyfile(f, tmp / f.name)
+            (tmp / STAMP).touch()
+            if entry.exists():
+                shutil.rmtree(entry)
+            os.replace(tmp, entry)
+        finally:
+            if tmp.exists():
+                shutil.rmtree(tmp)
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Drop least recently used entries until the cache fits `max_bytes`, return the number dropped
+        """
+        entries = []
+        total = 0
+        for shard in self.root.iterdir() if self.root.is_dir() else ():
+            for entry in shard.iterdir() if shard.is_dir() else ():
+                stamp = entry / STAMP
+                if entry.name.startswith(".") or not stamp.exists():
+                    continue
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((stamp.stat().st_mtime, size, entry))
+                total += size
+        dropped = 0
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            dropped += 1
+        return dropped
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+ICONS = [f"ti-icon-{i}" for i in range(4000)]
+
+# stands in for typst: answers --version and writes a few svg pages per compile
+STUB_TYPST = '''#!{python}
+import sys, pathlib, time
+if sys.argv[1] == "--version":
+    print("typst 0.0.0 (benchmark stub)")
+    sys.exit(0)
+time.sleep({delay})
+out = sys.argv[-1]
+for page in range(1, {pages} + 1):
+    pathlib.Path(out.replace("{{0p}}", str(page))).write_text({svg!r})
+'''
+
+def svg_page(kb: int) -> str:
+    """
+    Typst looking svg of about `kb` KB with the fills buildtyp strips
+    """
+    glyph = '<symbol id="g{0:032X}" overflow="visible"><path d="M 1.5 2.25 L 3.125 4.0625 Q 5.5 6.75 7.875 8.5 Z " fill="#000000"/></symbol>\n'
+    use = '<use xlink:href="#g{0:032X}" x="{1}" fill="#000000" fill-rule="nonzero"/>\n'
+    parts = ['<svg class="typst-doc" viewBox="0 0 595 842" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">\n',
+             '<path class="typst-shape" fill="#ffffff" d="M 0 0 L 0 841.8898 L 595.2756 841.8898 L 595.2756 0 Z "/>\n']
+    size, i = 0, 0
+    while size < kb * 1024:
+        part = use.format(i % 200, i * 9.655)
+        parts.append(part)
+        size += len(part)
+        i += 1
+    parts.append('<defs id="glyph">\n')
+    parts.extend(glyph.format(i) for i in range(200))
+    parts.append('</defs>\n</svg>\n')
+    return "".join(parts)
+
+def make_site(root: Path, articles: int, images: int, typst_every: int, svg_pages: int, svg_kb: int, templates: int, seed: int = 0) -> Dict[str, Path]:
+    """
+    Generate a synthetic site: articles with images/, typst posts with page svgs, a template tree using ti classes
+    and a tabler-icons style stylesheet
+    """
+    rnd = random.Random(seed)
+    content = root / "content" / "articles"
+    svg = svg_page(svg_kb)
+    for n in range(articles):
+        folder = content / f"post-{n:05d}"
+        image_dir = folder / "images"
+        image_dir.mkdir(parents=True, exist_ok=True)
+        is_typst = typst_every > 0 and n % typst_every == 0
+        tags = rnd.sample(["typst", "irs", "hugo", "python", "notes", "math"], 2)
+        (folder / "index.md").write_text(
+            f"---\ntitle: Post {n}\ndescription: synthetic post {n}\ntags:\n- {tags[0]}\n- {tags[1]}\n"
+            f"date: '2025-02-04'\ntypst: {str(is_typst).lower()}\nkatex: {str(n % 3 == 0).lower()}\n---\n\n"
+            + "Lorem ipsum dolor sit amet. " * 200, encoding="utf-8")
+        for i in range(images):
+            (image_dir / f"img-{i}.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(256))
+        if is_typst:
+            (folder / "main.typ").write_text(f'#import "/lib.typ": *\n= Post {n}\n#bibliography("ref.bib")\n', encoding="utf-8")
+            (folder / "lib.typ").write_text("#let x = 1\n", encoding="utf-8")
+            (folder / "ref.bib").write_text("@article{a, title={A}}\n", encoding="utf-8")
+            for page in range(1, svg_pages + 1):
+                (image_dir / f"page-{page}.svg").write_text(svg, encoding="utf-8")
+
+    layouts = root / "layouts"
+    for n in range(templates):
+        folder = layouts / f"partials-{n % 20}"
+        folder.mkdir(parents=True, exist_ok=True)
+        body = "".join(f'<div class="row"><i class="ti {rnd.choice(ICONS[:300])}"></i> {{{{ .Title }}}}</div>\n' for _ in range(50))
+        (folder / f"part-{n}.html").write_text(body, encoding="utf-8")
+
+    css = root / "assets" / "css" / "tabler-icons.min.css"
+    css.parent.mkdir(parents=True, exist_ok=True)
+    css.write_text(
+        "/*!\n * Tabler Icons (synthetic)\n */"
+        '@font-face{font-family:"tabler-icons";src:url("./fonts/tabler-icons.woff2?v3") format("woff2")}'
+        '.ti{font-family:"tabler-icons"!important;speak:none}'
+        + "".join(f'.{icon}:before{{content:"\\{0xe000 + i:x}"}}' for i, icon in enumerate(ICONS))
+        + "/*# sourceMappingURL=tabler-icons.min.css.map */", encoding="utf-8")
+    return {"content": root / "content", "layouts": layouts, "css": css}
+
+def write_stub_typst(bin_dir: Path, pages: int, svg_kb: int, delay: float) -> Path:
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    stub = bin_dir / "typst"
+    stub.write_text(STUB_TYPST.format(python=sys.executable, delay=delay, pages=pages, svg=svg_page(svg_kb)), encoding="utf-8")
+    stub.chmod(0o755)
+    return stub
+
+def measure(func: Callable, repeat: int, setup: Callable = None) -> dict:
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+def run_benchmarks(root: Path, paths: Dict[str, Path], args) -> Dict[str, dict]:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    import buildtyp
+    import frontmatter
+    import tablertrimer
+
+    results = {}
+    content = paths["content"]
+
+    def bench(name, func, setup=None):
+        print(f"[Bench] {name} ...", end="", flush=True)
+        results[name] = measure(func, args.repeat, setup)
+        print(f" {results[name]['median']:.4f}s")
+
+    bench("find_folders_with_file", lambda: buildtyp.find_folders_with_file(content, "index.md"))
+
+    folders = sorted(buildtyp.find_folders_with_file(content, "index.md"))
+    def read_all(cache):
+        for f in folders:
+            frontmatter.read_front_matter(f / "index.md", cache)
+    bench("parse_front_matter (cold)", lambda: read_all(frontmatter.FrontMatterCache()))
+    warm = frontmatter.FrontMatterCache()
+    bench("parse_front_matter (cached)", lambda: read_all(warm))
+    bench("parse_front_matter (full document)", lambda: [buildtyp.parse_front_matter((f / "index.md").read_text(encoding="utf-8")) for f in folders])
+
+    typst_dirs = [f / "images" for f in folders if (f / "main.typ").exists()]
+    svg = svg_page(args.svg_kb)
+
+    def reset_svgs():
+        for d in typst_dirs:
+            for page in range(1, args.svg_pages + 1):
+                (d / f"page-{page}.svg").write_text(svg, encoding="utf-8")
+    bench("remove_fill_attributes (dirty)", lambda: [buildtyp.remove_fill_attributes(d) for d in typst_dirs], setup=reset_svgs)
+    bench("remove_fill_attributes (clean)", lambda: [buildtyp.remove_fill_attributes(d) for d in typst_dirs])
+
+    pattern = r"ti ti(-\w+)*"
+    bench("find_strings_in_files", lambda: tablertrimer.find_strings_in_files(str(paths["layouts"]), pattern, name_only=True))
+    if args.jobs > 1:
+        bench(f"find_strings_in_files (jobs={args.jobs})", lambda: tablertrimer.find_strings_in_files(str(paths["layouts"]), pattern, name_only=True, jobs=args.jobs))
+
+    classes = [i.split(" ")[1] for i in tablertrimer.find_strings_in_files(str(paths["layouts"]), pattern, name_only=True)]
+    out_css = root / "static" / "css" / "tabler-icons.min.css"
+    out_css.parent.mkdir(parents=True, exist_ok=True)
+    index_dir = root / ".cache" / "tablertrimer"
+    bench("parse_css_file", lambda: tablertrimer.parse_css_file(str(paths["css"])))
+    bench("load_css_index (warm)", lambda: tablertrimer.load_css_index(str(paths["css"]), str(index_dir)))
+    bench("minify_css", lambda: tablertrimer.minify_css(str(paths["css"]), str(out_css), classes,
+                                                        origin_css=tablertrimer.load_css_index(str(paths["css"]), str(index_dir))))
+
+    stub_dir = root / "bin"
+    write_stub_typst(stub_dir, args.svg_pages, args.svg_kb, args.compile_delay)
+    env = dict(os.environ, PATH=f"{stub_dir}{os.pathsep}{os.environ.get('PATH', '')}", TYPST=str(stub_dir / "typst"))
+    manifest = root / ".cache" / "buildtyp" / "manifest.json"
+
+    def buildtyp_run(*extra):
+        cmd = [sys.executable, str(SCRIPTS_DIR / "buildtyp.py"), "-i", str(content), "--manifest", str(manifest), *extra]
+        subprocess.run(cmd, cwd=root, env=env, check=True, stdout=subprocess.DEVNULL)
+    bench("buildtyp compile (jobs=1)", lambda: buildtyp_run("--force"))
+    if args.jobs > 1:
+        bench(f"buildtyp compile (jobs={args.jobs})", lambda: buildtyp_run("--force", "-j", str(args.jobs)))
+    bench("buildtyp no-op", lambda: buildtyp_run())
+    return results
+
+def compare(results: Dict[str, dict], baseline_path: Path, threshold: float) -> List[str]:
+    """
+    Names of the benchmarks whose median got more than `threshold` (relative) slower than the baseline
+    """
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["results"]
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / max(baseline[name]["median"], 1e-9)
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"[Compare] {name:<40} {baseline[name]['median']:.4f}s -> {result['median']:.4f}s x{ratio:.2f} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the helper scripts against a synthetic site")
+    parser.add_argument('-a', '--articles', type=int, default=2000, help="Number of articles")
+    parser.add_argument('--images', type=int, default=20, help="Image files per article")
+    parser.add_argument('--typst_every', type=int, default=20, help="Every n-th article is a typst post")
+    parser.add_argument('--svg_pages', type=int, default=3, help="Svg pages per typst post")
+    parser.add_argument('--svg_kb', type=int, default=200, help="Size of each svg page in KB")
+    parser.add_argument('--templates', type=int, default=500, help="Number of template files")
+    parser.add_argument('--compile_delay', type=float, default=0.05, help="Seconds the stub typst spends per compile")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Jobs for the parallel variants")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Runs per benchmark")
+    parser.add_argument('-o', '--output', type=Path, default=Path("bench_output.json"), help="Where to write the results")
+    parser.add_argument('--compare', type=Path, help="Previous results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative slowdown reported as a regression")
+    parser.add_argument('--keep', type=Path, help="Generate the site here and keep it instead of a temp dir")
+    args = parser.parse_args()
+
+    # buildtyp runs with cwd=root, every path handed to it must not depend on the caller cwd
+    root = (args.keep or Path(tempfile.mkdtemp(prefix="bench-site-"))).resolve()
+    try:
+        print(f"[Bench] Generating site with {args.articles} articles in {root}")
+        start = time.perf_counter()
+        paths = make_site(root, args.articles, args.images, args.typst_every, args.svg_pages, args.svg_kb, args.templates)
+        print(f"[Bench] Generated in {time.perf_counter() - start:.1f}s")
+        results = run_benchmarks(root, paths, args)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    meta = {k: v for k, v in vars(args).items() if k in ("articles", "images", "typst_every", "svg_pages", "svg_kb", "templates", "compile_delay", "jobs", "repeat")}
+    meta.update(python=platform.python_version(), machine=platform.machine(), cpus=os.cpu_count(), time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    args.output.write_text(json.dumps({"meta": meta, "results": results}, indent=1), encoding="utf-8")
+    print(f"[Bench] Results written to {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,107 +1,658 @@
 import argparse
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
-import yaml
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
 # import toml
 import re
 import subprocess
 import datetime
+import hashlib
+import json
+from svgpost import merge_pages, strip_fill_attributes
+import frontmatter
+from instrument import RECORDER, run_profiled, stage
+from artifacts import CACHE_DIR, CACHE_SIZE, ArtifactCache
+
+TYPST_BIN = os.environ.get("TYPST", "typst")
+MANIFEST_PATH = Path(".cache/buildtyp/manifest.json")
+MANIFEST_VERSION = 1
+SOCKET_PATH = Path(".cache/buildtyp/buildtyp.sock")
+# typst writes here first, only the pages whose content changed are then moved into images/
+STAGING_DIR = Path(".cache/buildtyp/staging")
+# page bundle resources and generated output, never hold an index.md of their own
+SKIP_DIRS = {"images", "files", "fonts", "assets", "static", "node_modules", "public", "resources"}
+
+# `#import "x.typ"`, `#include "x.typ"` and path-taking calls like `bibliography("ref.bib")`
+TYP_DEP_PATTERN = re.compile(
+    r'#(?:import|include)\s+"([^"]+)"'
+    r'|\b(?:bibliography|image|read|json|csv|yaml|toml|xml|cbor)\(\s*"([^"]+)"'
+)
 
 def save_front_matter(file_path: Path, data: dict, format: str = 'yaml',v=False) -> None:
-    if format == 'yaml':
-        front_matter = yaml.dump(data, sort_keys=False, allow_unicode=True)
-        front_matter = f"---\n{front_matter}---\n"
-    # elif format == 'toml':
-    #     front_matter = toml.dumps(data)
-    #     front_matter = f"+++\n{front_matter}+++\n"
-    else:
+    # toml front matter is not supported
+    if format != 'yaml':
         raise ValueError("Unsupported format. Use 'yaml'.")
-    if v: print(f"[Front Matter] Writting to {file_path} ")
-    with file_path.open('w', encoding='utf-8') as file:
-        file.write(front_matter)
+    if frontmatter.write_front_matter(file_path, data):
+        if v: print(f"[Front Matter] Writting to {file_path} ")
+    elif v: print(f"[Front Matter] {file_path} unchanged")
 
-def remove_fill_attributes(directory: Path,v = False):
-    fill_pattern = r'fill="(?:#ffffff|#000000)"'
-
-    for file_path in directory.rglob("*.svg"):
+def remove_fill_attributes(directory: Path,v = False,pages: Optional[Iterable[Path]] = None):
+    """
+    Strip the fill attrs from `pages`, or from every svg under `directory` when no pages are given
+    """
+    for file_path in (directory.rglob("*.svg") if pages is None else pages):
         if v:print(f"[SVG] Try to remove fill attr from file: {file_path}")
+        strip_fill_attributes(file_path, v)
+
+def page_snapshot(image_dir: Path) -> dict:
+    snapshot = {}
+    for p in image_dir.glob("page-*.svg"):
+        st = p.stat()
+        snapshot[p] = (st.st_mtime_ns, st.st_size, st.st_ino)
+    return snapshot
 
-        content = file_path.read_text(encoding="utf-8")
+def written_pages(image_dir: Path, before: dict) -> List[Path]:
+    """
+    Pages typst (re)wrote since `before` was taken
+    """
+    return sorted(p for p, stat in page_snapshot(image_dir).items() if before.get(p) != stat)
 
-        content = re.sub(fill_pattern, " ", content)
+def drop_outputs(image_dir: Path, previous: Iterable[str], current: Iterable[Path]) -> None:
+    """
+    Remove the outputs of the previous build the current one did not write again (fewer pages, other output mode)
+    """
+    keep = {p.name for p in current}
+    for name in previous:
+        if name not in keep and (image_dir / name).exists():
+            (image_dir / name).unlink()
 
-        file_path.write_text(content, encoding="utf-8")
+def staging_dir(root: Path, key: str) -> Path:
+    """
+    The dir of its own the article `key` is compiled into, under the private staging `root` of a build
+    """
+    path = root / hashlib.sha1(key.encode()).hexdigest()[:16]
+    path.mkdir(exist_ok=True)
+    return path
+
+def sync_outputs(files: Iterable[Path], dest_dir: Path) -> Tuple[List[Path], int]:
+    """
+    Move staged outputs into `dest_dir`, files whose content is already there are left untouched
+    so that their mtime (and Hugo's live reload) only moves for the pages that really changed.
+    Return the outputs in `dest_dir` and how many of them were written.
+    """
+    import shutil
+
+    outputs = []
+    written = 0
+    for f in files:
+        dst = dest_dir / f.name
+        if not (dst.exists() and dst.stat().st_size == f.stat().st_size and dst.read_bytes() == f.read_bytes()):
+            shutil.move(str(f), str(dst))
+            written += 1
+        outputs.append(dst)
+    return outputs, written
 
 def parse_front_matter(content):
-    front_matter_pattern = re.compile(r'^(?:---|\+\+\+)\n(.*?)\n(?:---|\+\+\+)\n', re.DOTALL)
-    match = front_matter_pattern.search(content)
-    
-    if not match:
-        return None
-    
-    front_matter = match.group(1).strip()
-    
-    if match.group(0).startswith('---'):
-        return yaml.safe_load(front_matter)
+    return frontmatter.parse_front_matter(content)
 
 def read_markdown_file(file_path:Path):
-    content = file_path.read_text(encoding='utf-8')
-    
-    front_matter = parse_front_matter(content)
-    return front_matter
-
-def find_folders_with_file(directory:Path, target_file:str,v:bool = False) -> List[Path]:
-    folders_with_file = []
-    for f in directory.rglob('*'):
-        if (f.is_dir() and (f / target_file).exists()):# for searching in articles/
-            folders_with_file.append(f)
-            if v: print(f"[Walker] Adding {f if f.is_dir() else f.parent} to index.md Set")            
-        if (f.is_file() and f.name == target_file): # for specfic file
-            folders_with_file.append(f.parent)
-            if v: print(f"[Walker] Adding {f.parent} to indexmd Set") 
-    return set(folders_with_file)
-
-def main():
+    return frontmatter.read_front_matter(file_path)
+
+def iter_folders_with_file(directory:Path, target_file:str, v:bool = False, changed:Optional[Iterable[Path]] = None) -> Iterator[Path]:
+    """
+    Lazily yield every folder under `directory` that holds `target_file`.
+    Each directory is listed once with os.scandir, asset directories are never entered.
+    If `changed` is given only the folders owning those paths are yielded.
+    """
+    if changed is not None:
+        yield from folders_of_paths(directory, target_file, changed, v)
+        return
+
+    stack = [directory]
+    while stack:
+        folder = stack.pop()
+        subdirs = []
+        found = False
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.name == target_file and entry.is_file():
+                        found = True
+                    elif entry.is_dir() and entry.name not in SKIP_DIRS and not entry.name.startswith('.'):
+                        subdirs.append(entry.name)
+        except OSError as e:
+            if v: print(f"[Walker] Cannot list {folder}, {e}")
+            continue
+        if found:
+            if v: print(f"[Walker] Adding {folder} to index.md Set")
+            yield folder
+        stack.extend(folder / d for d in sorted(subdirs, reverse=True))
+
+def folders_of_paths(directory:Path, target_file:str, changed:Iterable[Path], v:bool = False) -> Iterator[Path]:
+    """
+    Map changed paths (e.g. from `git diff --name-only`) to the nearest enclosing folder holding `target_file`,
+    paths outside of `directory` are ignored
+    """
+    root = directory.resolve()
+    seen = set()
+    for p in changed:
+        p = Path(p)
+        folder = p if p.is_dir() else p.parent
+        while True:
+            resolved = folder.resolve()
+            if resolved in seen or not resolved.is_relative_to(root):
+                break
+            if (folder / target_file).is_file():
+                seen.add(resolved)
+                if v: print(f"[Walker] Adding {folder} to index.md Set, owns {p}")
+                yield folder
+                break
+            if resolved == root:
+                break
+            folder = folder.parent
+
+def path_key(path: Path) -> str:
+    """
+    How paths are stored in the manifest: relative to the working dir (the repo root), posix style
+    """
+    return Path(os.path.relpath(Path(path).resolve())).as_posix()
+
+def git_environ(git_env: Optional[dict] = None) -> Optional[dict]:
+    """
+    Environment for git calls made on behalf of a client, its GIT_* variables replace ours.
+    None (inherit) when the build runs in the client's own process.
+    """
+    if git_env is None:
+        return None
+    env = {k: v for k, v in os.environ.items() if not k.startswith("GIT_")}
+    env.update(git_env)
+    return env
+
+def staged_paths(env: Optional[dict] = None) -> List[Path]:
+    """
+    Paths staged for the next commit, deleted ones included since dependents have to notice them
+    """
+    r = subprocess.run(["git", "diff", "--cached", "--name-only", "--diff-filter=ACMRD", "-z"], capture_output=True, check=True, env=env)
+    return [Path(p) for p in r.stdout.decode("utf-8").split("\0") if p]
+
+def affected_folders(directories:Iterable[Path], target_file:str, changed:Iterable[Path], manifest:dict, v:bool = False,
+                     typst_root:Optional[Path] = None) -> Set[Path]:
+    """
+    Articles under `directories` that own one of the changed paths, or whose dependencies
+    (shared .typ libraries, bibliographies, ...) include one. Dependencies come from the manifest,
+    articles it does not know yet (e.g. in a fresh clone) have theirs scanned.
+    """
+    changed = list(changed)
+    changed_keys = {path_key(p) for p in changed}
+    folders = {}
+    for directory in directories:
+        for folder in folders_of_paths(directory, target_file, changed, v):
+            folders.setdefault(path_key(folder), folder)
+        root = path_key(directory)
+        for key, entry in manifest["articles"].items():
+            if key in folders or not (root == "." or key == root or key.startswith(f"{root}/")):
+                continue
+            hit = changed_keys.intersection(entry.get("deps", ()))
+            if hit and (Path(key) / target_file).is_file():
+                if v: print(f"[Deps] {key} depends on changed {sorted(hit)}")
+                folders[key] = Path(key)
+        for folder in iter_folders_with_file(directory, target_file):
+            key = path_key(folder)
+            typ_src = folder / "main.typ"
+            if key in folders or key in manifest["articles"] or not typ_src.is_file():
+                continue
+            hit = changed_keys.intersection(path_key(d) for d in collect_dependencies(typ_src, typst_root or folder))
+            if hit:
+                if v: print(f"[Deps] {key} (not in the manifest) depends on changed {sorted(hit)}")
+                folders[key] = folder
+    return set(folders.values())
+
+def find_folders_with_file(directory:Path, target_file:str,v:bool = False, changed:Optional[Iterable[Path]] = None) -> Set[Path]:
+    return set(iter_folders_with_file(directory, target_file, v, changed))
+
+def typst_version() -> str:
+    """
+    Version string of the typst compiler, part of every article's build hash
+    """
+    try:
+        return subprocess.run([TYPST_BIN, "--version"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def collect_dependencies(typ_src: Path, root: Path) -> List[Path]:
+    """
+    Follow `#import`/`#include`/`bibliography(...)` like references of a typst source recursively.
+    Package imports (`@preview/...`) are skipped, missing files are kept so that creating them triggers a rebuild.
+    """
+    deps = []
+    pending = [typ_src]
+    seen = set()
+    while pending:
+        src = pending.pop()
+        if src in seen:
+            continue
+        seen.add(src)
+        deps.append(src)
+        if src.suffix != ".typ" or not src.is_file():
+            continue
+        for ref in typ_references(src):
+            # typst resolves absolute paths against the project root
+            dep = root / ref.lstrip("/") if ref.startswith("/") else src.parent / ref
+            pending.append(Path(os.path.normpath(dep)))
+    return deps
+
+# path -> (mtime_ns, size, value), so that unchanged files are read once per process
+_REFS_CACHE = {}
+_DIGEST_CACHE = {}
+
+def _cached(cache: dict, path: Path, compute):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    hit = cache.get(path)
+    if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return hit[2]
+    value = compute(path)
+    cache[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+def typ_references(typ_src: Path) -> List[str]:
+    """
+    Local paths referenced by a typst source, package imports (`@preview/...`) left out
+    """
+    def parse(p):
+        refs = (m.group(1) or m.group(2) for m in TYP_DEP_PATTERN.finditer(p.read_text(encoding="utf-8")))
+        return [ref for ref in refs if not ref.startswith("@")]
+    return _cached(_REFS_CACHE, typ_src, parse) or []
+
+def file_digest(path: Path) -> bytes:
+    if not path.is_file():
+        return b"<missing>"
+    digest = _cached(_DIGEST_CACHE, path, lambda p: hashlib.sha256(p.read_bytes()).digest())
+    return digest if digest is not None else b"<missing>"
+
+def hash_inputs(typ_src: Path, root: Path, version: str, deps: Optional[List[Path]] = None) -> str:
+    """
+    Digest of the typst version and every input file of an article
+    """
+    h = hashlib.sha256(version.encode())
+    for dep in sorted(deps if deps is not None else collect_dependencies(typ_src, root)):
+        h.update(dep.relative_to(root).as_posix().encode() if dep.is_relative_to(root) else str(dep).encode())
+        h.update(b"\0")
+        h.update(file_digest(dep))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "articles": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "articles": {}}
+    return manifest
+
+def save_manifest(manifest: dict, path: Path = MANIFEST_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+def compile_typst(typ_src: Path, output_svg: Path, root: Optional[Path] = None) -> Tuple[subprocess.CompletedProcess, List[Path]]:
+    """
+    Compile one article, output is captured so that parallel jobs can be reported in order.
+    `root` is the typst project root (absolute paths and the furthest `..` reachable), the article folder by default.
+    Also return the pages written by this compilation.
+    """
+    with stage("typst compile", "compile", article=typ_src.parent):
+        before = page_snapshot(output_svg.parent)
+        root_args = ["--root", str(root)] if root is not None else []
+        r = subprocess.run([TYPST_BIN,"compile","-f","svg",*root_args,typ_src,output_svg], capture_output=True, text=True)
+        return r, written_pages(output_svg.parent, before)
+
+class BuildState():
+    """
+    What a build needs besides its arguments. A one-shot run uses a fresh state,
+    the daemon (--serve) keeps one per manifest alive between requests.
+    """
+    def __init__(self, manifest_path: Path = MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self.manifest = None
+        self.manifest_stat = None
+        self.version = None
+
+    def load(self) -> dict:
+        """
+        Current manifest, re-read when another process changed the file
+        """
+        try:
+            st = self.manifest_path.stat()
+            stat = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat = None
+        if self.manifest is None or stat != self.manifest_stat:
+            self.manifest = load_manifest(self.manifest_path)
+            self.manifest_stat = stat
+        return self.manifest
+
+    def save(self) -> None:
+        save_manifest(self.manifest, self.manifest_path)
+        st = self.manifest_path.stat()
+        self.manifest_stat = (st.st_mtime_ns, st.st_size)
+
+    def typst_version(self) -> str:
+        if self.version is None:
+            with stage("typst --version"):
+                self.version = typst_version()
+        return self.version
+
+def make_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="tools use to build typst source files")
     parser.add_argument('-v', '--verbose', action='store_true', help="Enable Verbose",default=False)
     parser.add_argument('-d','--delfill',help="Just del fill",action='store_true',default=False)
-    parser.add_argument('-i', '--input', type=str, required=True, help="Where Content dir")
+    parser.add_argument('-i', '--input', type=str, action='append', help="Where Content dir, can be given several times")
+    parser.add_argument('-f', '--force', action='store_true', help="Rebuild even if the inputs are unchanged, without restoring from the svg cache", default=False)
+    parser.add_argument('-c', '--changed', nargs='+', type=Path, help="Only build the folders owning these changed paths (e.g. from git diff --name-only)")
+    parser.add_argument('-s', '--staged', action='store_true', help="Only build the articles affected by the changes staged in git", default=False)
+    parser.add_argument('-a', '--add', action='store_true', help="git add the folders of the rebuilt articles, with --staged of every affected article even if it was up to date", default=False)
+    parser.add_argument('-r', '--root', type=Path, help="typst project root, lets articles use shared files outside their folder (`/lib.typ`, `../../shared.typ`), the article folder by default")
+    parser.add_argument('-j', '--jobs', type=int, help="Number of typst compilations to run at once", default=1)
+    parser.add_argument('-m', '--output_mode', choices=["pages", "sprite"], help="pages: one page-N.svg per page, sprite: all pages merged into images/pages.svg with shared glyphs and a pages.json index", default="pages")
+    parser.add_argument('--cache_dir', type=Path, help=f"Content addressed cache of compiled svgs, restored instead of compiling on a hit, can be shared or saved between CI runs (default {CACHE_DIR}, or $BUILDTYP_CACHE_DIR)", default=CACHE_DIR)
+    parser.add_argument('--cache_size', type=int, help="Size in MiB past which the least recently used cache entries are evicted", default=CACHE_SIZE >> 20)
+    parser.add_argument('--no_cache', action='store_true', help="Neither restore from nor store into the svg cache", default=False)
+    parser.add_argument('-w', '--watch', action='store_true', help="Build, then keep rebuilding the articles whose main.typ or dependencies change", default=False)
+    parser.add_argument('--debounce', type=float, help="Seconds a burst of saves is merged over in --watch", default=0.1)
+    parser.add_argument('--manifest', type=Path, help="Where the build manifest is kept", default=MANIFEST_PATH)
+    parser.add_argument('--timings', action='store_true', help="Print how long each stage took", default=False)
+    parser.add_argument('--trace', type=str, help="Write the stage timings as a Chrome trace json")
+    parser.add_argument('--profile', type=str, help="Run under cProfile and dump the stats here")
+    parser.add_argument('--serve', type=Path, nargs='?', const=SOCKET_PATH, help=f"Run as a daemon answering build requests on this unix socket (default {SOCKET_PATH}), see buildtypc.py")
+    parser.add_argument('--idle_timeout', type=float, help="Seconds the daemon waits for a request before exiting", default=900)
+    # set by the daemon to the GIT_* environment of the client
+    parser.set_defaults(git_env=None)
+    return parser
 
+def main() -> int:
+    parser = make_parser()
     args = parser.parse_args()
 
-    if not os.path.isdir(args.input):
-        print(f"Error: Input dir '{args.input}' does not exist.")
-        return
+    if args.serve:
+        return serve(args.serve, args.idle_timeout, args.verbose)
+    if not args.input:
+        parser.error("the following arguments are required: -i/--input")
+    if args.watch:
+        return watch(args, BuildState(args.manifest))
+    return run(args, BuildState(args.manifest))
+
+def run(args, state: "BuildState") -> int:
+    RECORDER.reset()
+    rc = run_profiled(build, args.profile, args, state)
+    if args.timings:
+        RECORDER.report()
+    if args.trace:
+        RECORDER.write_trace(args.trace)
+        print(f"[Timing] Trace written to {args.trace}")
+    return rc
+
+def watch_paths(inputs: Iterable[str], manifest: dict) -> Set[str]:
+    """
+    The input dirs (new articles and bundle files) plus the dependencies living outside of them
+    """
+    roots = [os.path.normpath(i) for i in inputs]
+    paths = set(roots)
+    for entry in manifest["articles"].values():
+        for dep in entry.get("deps", []):
+            if not any(dep == r or dep.startswith(r + "/") for r in roots) and os.path.exists(dep):
+                paths.add(dep)
+    return paths
+
+def output_paths(manifest: dict) -> Set[str]:
+    return {os.path.normpath(os.path.join(key, "images", name)) for key, entry in manifest["articles"].items() for name in entry.get("pages", [])}
+
+def watch(args, state: "BuildState") -> int:
+    """
+    Build once, then rebuild the articles affected by each burst of changes until interrupted
+    """
+    import time
+    from watcher import open_watcher
+
+    run(args, state)
+    paths = watch_paths(args.input, state.load())
+    watcher = open_watcher(sorted(paths), interval=0.5, debounce=args.debounce, verbose=args.verbose)
+    print(f"[Watch] Watching {len(paths)} paths, Ctrl+C to stop")
+    try:
+        while True:
+            changed = watcher.changes()
+            manifest = state.load()
+            # our own outputs and temp files would otherwise trigger another round
+            ignored = output_paths(manifest)
+            changed = sorted(Path(c) for c in map(os.path.normpath, changed)
+                             if c not in ignored and not os.path.basename(c).startswith("."))
+            if not changed:
+                continue
+            if args.verbose: print(f"[Watch] {len(changed)} changed: {', '.join(map(str, changed[:5]))}")
+            start = time.perf_counter()
+            run(argparse.Namespace(**{**vars(args), "changed": changed, "staged": False}), state)
+            print(f"[Watch] Done in {time.perf_counter() - start:.2f}s")
+            now = watch_paths(args.input, state.load())
+            if now != paths:
+                watcher.close()
+                paths = now
+                watcher = open_watcher(sorted(paths), interval=0.5, debounce=args.debounce, verbose=args.verbose)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+
+def serve(socket_path: Path, idle_timeout: float, v: bool = False) -> int:
+    """
+    Answer build requests from buildtypc.py on a unix socket, one at a time.
+    A request is a json line {"cwd": ..., "argv": [...], "git_env": {...}}, the reply {"returncode": ..., "output": ...}.
+    The manifest, typst version and the front matter/hash caches stay warm between requests.
+    """
+    import socket
+    states = {}
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            if probe.connect_ex(str(socket_path)) == 0:
+                print(f"[Daemon] Already running on {socket_path}")
+                return 1
+        # left behind by a daemon that was killed
+        socket_path.unlink()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen()
+    server.settimeout(idle_timeout)
+    print(f"[Daemon] Listening on {socket_path}, pid {os.getpid()}")
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                print(f"[Daemon] Idle for {idle_timeout}s, exiting")
+                return 0
+            with conn:
+                conn.settimeout(None)
+                try:
+                    request = json.loads(conn.makefile("rb").readline())
+                except ValueError:
+                    continue
+                reply = handle_request(request, states)
+                if v: print(f"[Daemon] {request.get('argv')} -> {reply['returncode']}")
+                try:
+                    conn.sendall(json.dumps(reply).encode() + b"\n")
+                except OSError:
+                    pass
+    finally:
+        server.close()
+        if socket_path.exists():
+            socket_path.unlink()
+
+def handle_request(request: dict, states: dict) -> dict:
+    import contextlib
+    import io
+
+    if request.get("cwd") != os.getcwd():
+        return {"returncode": 2, "output": f"[Daemon] Serving {os.getcwd()}, not {request.get('cwd')}\n", "retry_local": True}
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            args = make_parser().parse_args(request.get("argv", []))
+            if not args.input or args.serve or args.watch:
+                raise SystemExit(2)
+        except SystemExit:
+            return {"returncode": 2, "output": out.getvalue(), "retry_local": True}
+        # git commit -a/<paths> hands the hook a temporary index, staged paths and git add must use it
+        args.git_env = request.get("git_env", {})
+        state = states.setdefault(args.manifest, BuildState(args.manifest))
+        try:
+            rc = run(args, state)
+        except Exception as e:
+            print(f"[Daemon] Build failed, {e!r}")
+            rc = 1
+    return {"returncode": rc, "output": out.getvalue()}
+
+def build(args, state: Optional[BuildState] = None) -> int:
+    for input_dir in args.input:
+        if not os.path.isdir(input_dir):
+            print(f"Error: Input dir '{input_dir}' does not exist.")
+            return 1
     
     v = args.verbose
 
     if args.verbose:
-        print(f"Input dir: {args.input}")
+        print(f"Input dir: {', '.join(args.input)}")
     
+    state = state or BuildState(args.manifest)
+    manifest = state.load()
+    version = state.typst_version()
+    if v: print(f"[Typst] {version}")
+
     target_file = "index.md"
-    for index_folder in find_folders_with_file(Path(args.input), target_file,v):
+    pending = []
+    built = []
+    # typst articles the changes reach, built now or already up to date
+    affected = []
+    cache = None if args.no_cache or args.delfill else ArtifactCache(args.cache_dir, args.cache_size << 20)
+    inputs = [Path(i) for i in args.input]
+    with stage("discover", path=", ".join(args.input)):
+        if args.changed is None and not args.staged:
+            folders = set()
+            for input_dir in inputs:
+                folders |= find_folders_with_file(input_dir, target_file, v)
+        else:
+            changed = list(args.changed or [])
+            if args.staged:
+                changed += staged_paths(git_environ(args.git_env))
+                if v: print(f"[Git] {len(changed)} changed paths")
+            folders = affected_folders(inputs, target_file, changed, manifest, v, args.root)
+        # the same article reached through two inputs is built once
+        folders = sorted({path_key(f): f for f in folders}.values())
+    for index_folder in folders:
         index_md = index_folder / target_file
         image_dir = index_folder / "images"
         typ_src = index_folder / "main.typ"
-        output_svg = image_dir / "page-{0p}.svg"
 
-        front_matter = read_markdown_file(index_md)
+        with stage("front matter", "front-matter", article=index_folder):
+            front_matter = read_markdown_file(index_md) or {}
 
         if not front_matter.get("typst", False):
             if v:
                 print(f"[Typst Check]Skipping {index_folder} for typst not enabled.")
             continue
         
-        if not args.delfill:
-            r = subprocess.Popen(["typst","compile","-f","svg",typ_src,output_svg])
-            if r.wait() != 0: print(f"Error occurred when compiling typst, {r.returncode}")
+        if args.delfill:
+            with stage("svg post-process", "svg", article=index_folder):
+                remove_fill_attributes(image_dir,v)
+            continue
+        affected.append(index_folder)
+
+        key = path_key(index_folder)
+        with stage("hash inputs", "hash", article=index_folder):
+            deps = collect_dependencies(typ_src, args.root or index_folder)
+            digest = hash_inputs(typ_src, index_folder, version, deps)
+        entry = manifest["articles"].get(key, {})
+        if not args.force and entry.get("digest") == digest and entry.get("mode", "pages") == args.output_mode:
+            if v: print(f"[Manifest] Skipping {index_folder}, inputs unchanged.")
+            continue
+        deps = sorted(path_key(d) for d in deps)
+        if cache is not None and not args.force:
+            with stage("cache restore", "cache", article=index_folder):
+                restored = cache.get(f"{digest}-{args.output_mode}", image_dir)
+            if restored is not None:
+                print(f"[Cache] {index_folder}: restored {len(restored)} files")
+                drop_outputs(image_dir, entry.get("pages", []), restored)
+                manifest["articles"][key] = {"digest": digest, "pages": [p.name for p in restored], "deps": deps, "mode": args.output_mode}
+                state.save()
+                built.append(index_folder)
+                continue
+        pending.append((index_folder, front_matter, key, digest, deps))
+
+    failed = 0
+    import shutil
+    import tempfile
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    # private to this build, a --watch process and a hook building the same article don't share it
+    staging_root = Path(tempfile.mkdtemp(dir=STAGING_DIR))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            # map keeps submission order, so results are reported in folder order
+            results = pool.map(lambda job: compile_typst(job[0] / "main.typ", staging_dir(staging_root, job[2]) / "page-{0p}.svg", args.root), pending)
+            for (index_folder, front_matter, key, digest, deps), (r, pages) in zip(pending, results):
+                if v or r.returncode != 0:
+                    sys.stdout.write(r.stdout)
+                    sys.stdout.write(r.stderr)
+                if r.returncode != 0:
+                    print(f"[Typst] {index_folder}: Error occurred when compiling typst, {r.returncode}")
+                    failed += 1
+                    continue
+                print(f"[Typst] {index_folder}: OK")
+
+                image_dir = index_folder / "images"
+                staging = staging_dir(staging_root, key)
+                previous = manifest["articles"].get(key, {}).get("pages", [])
+                if args.output_mode == "sprite":
+                    with stage("svg merge", "svg", article=index_folder):
+                        sprite = merge_pages(pages, staging, v)
+                    for p in pages:
+                        p.unlink()
+                    pages = sprite
+                with stage("svg post-process", "svg", article=index_folder):
+                    remove_fill_attributes(staging,v,[p for p in pages if p.suffix == ".svg"])
+                    image_dir.mkdir(exist_ok=True)
+                    pages, written = sync_outputs(pages, image_dir)
+                if v: print(f"[SVG] {index_folder}: {written} of {len(pages)} outputs changed")
+                drop_outputs(image_dir, previous, pages)
+                manifest["articles"][key] = {"digest": digest, "pages": [p.name for p in pages], "deps": deps, "mode": args.output_mode}
+                state.save()
+
+                # update build time
+                front_matter['build_time'] = datetime.datetime.now().strftime("%Y-%m-%d")
+                with stage("front matter write", "front-matter", article=index_folder):
+                    save_front_matter(index_folder / target_file,front_matter,v=v)
+
+                if cache is not None:
+                    with stage("cache store", "cache", article=index_folder):
+                        cache.put(f"{digest}-{args.output_mode}", pages)
+                built.append(index_folder)
+    finally:
+        # failed compilations leave their partial output behind in there
+        shutil.rmtree(staging_root, ignore_errors=True)
 
-            # update build time
-            front_matter['build_time'] = datetime.datetime.now().strftime("%Y-%m-%d")
-            save_front_matter(index_md,front_matter,v=v)
+    # with --staged an article may have been built earlier (--watch, a preview run) and be skipped now,
+    # its outputs still have to go into the commit along with the staged sources
+    to_add = affected if args.staged else built
+    if args.add and to_add:
+        subprocess.run(["git", "add", "--", *map(str, to_add)], check=True, env=git_environ(args.git_env))
+        if v: print(f"[Git] Added {len(to_add)} {'affected' if args.staged else 'rebuilt'} folders")
 
-        remove_fill_attributes(image_dir,v)
+    return 1 if failed else 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
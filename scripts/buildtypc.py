@@ -0,0 +1,68 @@
+"""
+Thin client for `buildtyp.py --serve`, forwards its arguments to the daemon so that a build
+does not pay for a cold interpreter with yaml loaded and empty caches.
+Falls back to running buildtyp.py itself when no daemon answers.
+Only the standard library pieces needed to talk to the socket are imported here.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILDTYP = os.path.join(SCRIPT_DIR, "buildtyp.py")
+SOCKET_PATH = os.path.join(".cache", "buildtyp", "buildtyp.sock")
+
+def request(socket_path: str, argv: list):
+    """
+    Send one build request, None when no daemon is listening
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(socket_path)
+            conn.sendall(json.dumps({"cwd": os.getcwd(), "argv": argv, "git_env": git_env()}).encode() + b"\n")
+            reply = conn.makefile("rb").readline()
+    except OSError:
+        return None
+    try:
+        return json.loads(reply)
+    except ValueError:
+        return None
+
+def git_env() -> dict:
+    """
+    The GIT_* variables git set for the hook (e.g. GIT_INDEX_FILE pointing at the temporary index of
+    `git commit -a`), the daemon runs git with these instead of its own
+    """
+    return {k: v for k, v in os.environ.items() if k.startswith("GIT_")}
+
+def spawn_daemon(socket_path: str) -> None:
+    # the daemon outlives this commit, it must not keep pointing at its index
+    env = {k: v for k, v in os.environ.items() if not k.startswith("GIT_")}
+    subprocess.Popen([sys.executable, BUILDTYP, "--serve", socket_path],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True, env=env)
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a build request to a running `buildtyp.py --serve`, other arguments are the ones of buildtyp.py",
+                                     allow_abbrev=False)
+    parser.add_argument('--socket', default=SOCKET_PATH, help="Unix socket of the daemon")
+    parser.add_argument('--spawn', action='store_true', default=False, help="Start a daemon for the next requests if none is running")
+    args, argv = parser.parse_known_args()
+
+    reply = request(args.socket, argv)
+    if reply is not None and not reply.get("retry_local"):
+        sys.stdout.write(reply.get("output", ""))
+        sys.stdout.flush()
+        sys.exit(reply.get("returncode", 1))
+
+    if reply is None and args.spawn:
+        spawn_daemon(args.socket)
+    # no daemon (yet), build in this process
+    sys.stdout.flush()
+    os.execv(sys.executable, [sys.executable, BUILDTYP, *argv])
+
+if __name__ == "__main__":
+    main()
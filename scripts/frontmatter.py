@@ -0,0 +1,182 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from functools import lru_cache
+
+CACHE_PATH = Path(".cache/frontmatter.pickle")
+CACHE_VERSION = 1
+
+DELIMITERS = (b"---", b"+++")
+
+def read_header(file_path: Path) -> Optional[Tuple[bytes, str]]:
+    """
+    Read only the front matter of a markdown file, the body is never loaded.
+    Return (delimiter, header text) or None when the file has no front matter.
+    """
+    with open(file_path, "rb") as f:
+        first = f.readline().rstrip(b"\r\n")
+        if first not in DELIMITERS:
+            return None
+        lines = []
+        for line in f:
+            if line.rstrip(b"\r\n") == first:
+                return first, b"".join(lines).decode("utf-8")
+            lines.append(line)
+    return None
+
+@lru_cache(maxsize=None)
+def _yaml():
+    """
+    yaml is imported on first use, reading headers and cache hits don't need it.
+    Prefer the libyaml bindings, they are an order of magnitude faster than the pure python ones.
+    """
+    import yaml
+    return yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader), getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+def read_body(file_path: Path) -> str:
+    """
+    Everything after the front matter (the whole file when there is none)
+    """
+    with open(file_path, "rb") as f:
+        first = f.readline()
+        delimiter = first.rstrip(b"\r\n")
+        if delimiter in DELIMITERS:
+            for line in f:
+                if line.rstrip(b"\r\n") == delimiter:
+                    return f.read().decode("utf-8")
+        f.seek(0)
+        return f.read().decode("utf-8")
+
+def load_yaml(text: str) -> dict:
+    yaml, Loader, _ = _yaml()
+    return yaml.load(text, Loader=Loader) or {}
+
+def dump_yaml(data: dict) -> str:
+    yaml, _, Dumper = _yaml()
+    return yaml.dump(data, Dumper=Dumper, sort_keys=False, allow_unicode=True)
+
+def parse_front_matter(content: str) -> Optional[dict]:
+    """
+    Parse the yaml front matter of an in memory document
+    """
+    if not content.startswith("---\n"):
+        return None
+    end = content.find("\n---\n", 3)
+    if end < 0:
+        return None
+    return load_yaml(content[4:end + 1])
+
+def dump_front_matter(data: dict) -> str:
+    return f"---\n{dump_yaml(data)}---\n"
+
+def write_front_matter(file_path: Path, data: dict) -> bool:
+    """
+    Replace the front matter of `file_path` with `data`, keeping the body byte for byte.
+    Nothing is written when the header would not change, otherwise the file is swapped atomically.
+    Return whether the file was written.
+    """
+    header = dump_front_matter(data).encode("utf-8")
+    if not os.path.exists(file_path):
+        file_path.write_bytes(header)
+        return True
+
+    with open(file_path, "rb") as src:
+        old_header = b""
+        lines = [src.readline()]
+        if lines[0].rstrip(b"\r\n") == b"---":
+            for line in src:
+                lines.append(line)
+                if line.rstrip(b"\r\n") == b"---":
+                    old_header = b"".join(lines)
+                    break
+        if old_header == header:
+            return False
+        # same data, only formatted differently (e.g. by hand), not worth a diff
+        if old_header and load_yaml(b"".join(lines[1:-1]).decode("utf-8")) == data:
+            return False
+        body_start = len(old_header)
+
+        fd, tmp = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                dst.write(header)
+                src.seek(body_start)
+                shutil.copyfileobj(src, dst)
+            os.chmod(tmp, os.stat(file_path).st_mode & 0o7777)
+            os.replace(tmp, file_path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+    return True
+
+class FrontMatterCache():
+    """
+    Parsed front matter keyed on path, an entry is reused while the file keeps its mtime and size.
+    The cache can be pickled to disk so that short lived commands share it.
+    """
+    def __init__(self):
+        self.entries: Dict[str, Tuple[int, int, Optional[dict]]] = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def get(self, file_path: Path) -> Optional[dict]:
+        st = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        hit = self.entries.get(key)
+        if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            meta = hit[2]
+        else:
+            header = read_header(file_path)
+            # only yaml front matter is supported
+            meta = load_yaml(header[1]) if header is not None and header[0] == b"---" else None
+            with self.lock:
+                self.entries[key] = (st.st_mtime_ns, st.st_size, meta)
+                self.dirty = True
+        # callers are free to modify what they get back
+        return dict(meta) if meta is not None else None
+
+    def load(self, path: Path = CACHE_PATH) -> "FrontMatterCache":
+        try:
+            with open(path, "rb") as f:
+                version, entries = pickle.load(f)
+            if version == CACHE_VERSION:
+                self.entries.update(entries)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            pass
+        return self
+
+    def save(self, path: Path = CACHE_PATH) -> None:
+        if not self.dirty:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((CACHE_VERSION, self.entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.dirty = False
+
+CACHE = FrontMatterCache()
+
+def read_front_matter(file_path: Path, cache: FrontMatterCache = CACHE) -> Optional[dict]:
+    return cache.get(file_path)
+
+def matches(meta: dict, typst: Optional[bool] = None, katex: Optional[bool] = None, tags: Iterable[str] = ()) -> bool:
+    """
+    Whether a post's front matter passes the given filters, None means don't care
+    """
+    if typst is not None and bool(meta.get("typst", False)) != typst:
+        return False
+    if katex is not None and bool(meta.get("katex", False)) != katex:
+        return False
+    post_tags = meta.get("tags") or []
+    return all(t in post_tags for t in tags)
+
+def filter_posts(index_files: Iterable[Path], cache: FrontMatterCache = CACHE, **filters) -> Iterator[Tuple[Path, dict]]:
+    for index_md in index_files:
+        meta = cache.get(index_md)
+        if meta is not None and matches(meta, **filters):
+            yield index_md, meta
@@ -1,30 +1,16 @@
 import argparse
 from typing import Callable
 import sys
-import subprocess
 from pathlib import Path
 from datetime import datetime
 import os
-import shutil
-import json
 
 DEPENDENCE = {
     "yaml": "PyYAML",
-    "typer":"typer"
-}
-
-META_DATA = {
-    "title": ("Title of the new post",str),
-    "description": ("Description of the post",str),
-    "tags": ("Tags of the post",list,[]),
-    "categories": ("Category of the post", list,[]),
-    "date": ("Date of the post", str, datetime.now().strftime("%Y-%m-%d")),
-    "withToc": ("Show table of contents",bool,True),
-    "cover": ("Cover images of the post",str,""),
-    "keepOrigin":("Keep the origin cover img instead of resize it.(May cause long-loading-time issue)",bool,False),
-    "typst":("Enable typst for the post",bool,False),
-    "noWordTime":("Don't show WrodCount and reading time.(Will be true while typst is sat to true)",bool,False),
-    "katex":("Enable Katex for the post",bool,False)
+    "typer":"typer",
+    "fontTools":"fonttools",
+    "brotli":"brotli",
+    "PIL":"Pillow"
 }
 
 APPEND_DATA = {
@@ -32,6 +18,7 @@ APPEND_DATA = {
 }
 
 def copy_folder(src: Path, dst: Path):
+    import shutil
 
     dst.mkdir(parents=True, exist_ok=True)
 
@@ -43,20 +30,19 @@ def copy_folder(src: Path, dst: Path):
 
 def save_front_matter(file_path: Path, data: dict, format: str = 'yaml',v=False) -> None:
     try:
-        import yaml
+        import frontmatter
     except ImportError as ie:
         print(f"Failed to import module, {ie}")
 
-    if format == 'yaml':
-        front_matter = yaml.dump(data, sort_keys=False, allow_unicode=True)
-        front_matter = f"---\n{front_matter}---\n"
-    else:
+    # toml front matter is not supported
+    if format != 'yaml':
         raise ValueError("Unsupported format. Use 'yaml'.")
-    if v: print(f"[Front Matter] Writting to {file_path} ")
-    with file_path.open('w', encoding='utf-8') as file:
-        file.write(front_matter)
+    if frontmatter.write_front_matter(file_path, data):
+        if v: print(f"[Front Matter] Writting to {file_path} ")
+    elif v: print(f"[Front Matter] {file_path} unchanged")
 
 def install_dep(packages, mirror="https://pypi.tuna.tsinghua.edu.cn/simple/"):
+    import subprocess
     for human_pack_name, pypi_pack_name in packages.items():
         try:
             __import__(human_pack_name)
@@ -77,6 +63,10 @@ def init(args):
     """
     init subcommand function
     """
+    import json
+    import shutil
+    import subprocess
+
     print("Initializing theme")
 
     print("Checking dependencies")
@@ -115,7 +105,7 @@ def init(args):
       "tag": ["Productivity"],
       "status": "Working"
     }]
-    with open("data/projects.json","w",encoding="utf-8") as f:
+    with open("projects.json","w",encoding="utf-8") as f:
         json.dump(template_data, f)
 
     print("Doing script setup")
@@ -131,31 +121,126 @@ def init(args):
 def new(args):
     content_floder = Path("./content/articles")
     if args.overwrite_dir: content_floder = Path(args.overwrite_dir)
+    import posts
+
+    if args.batch:
+        try:
+            created = posts.create_posts(posts.read_entries(Path(args.batch)), content_floder, args.jobs, v=args.verbose)
+        except ValueError as e:
+            print(f"Error: nothing created\n{e}")
+            exit(-1)
+        print(f"Created {len(created)} posts at {content_floder}")
+        return
+
     meta_data = {}
-    for k,v in META_DATA.items():
+    for k,v in posts.META_DATA.items():
         meta_data[k] = ask_question(*v)
 
     title = meta_data.get("title")
-    arcticle_dir:Path = content_floder / title.lower().replace(" ","-")
+    arcticle_dir:Path = content_floder / posts.slugify(title)
     if arcticle_dir.exists():
         print(f"Error: Post with title {title} already exists.")
         exit(-1)
     
     print(f"\nCreating new posts at {arcticle_dir}")
 
-    os.mkdir(arcticle_dir)
-    os.mkdir(arcticle_dir / "images")
+    posts.create_post(arcticle_dir, posts.post_meta(meta_data))
+    print(f"[Front Matter] Writting to {arcticle_dir / 'index.md'} ")
+    
 
-    if meta_data['typst']:
-        meta_data['noWordTime'] = True
-        meta_data['withToc'] = False
+def list_posts(args):
+    """
+    list subcommand function, filter posts on their front matter
+    """
+    try:
+        import frontmatter
+        from buildtyp import iter_folders_with_file
+    except ImportError as ie:
+        print(f"Failed to import module, {ie}")
+        sys.exit(1)
 
-        typ = arcticle_dir / "main.typ"
+    cache = frontmatter.FrontMatterCache().load()
+    index_files = (folder / "index.md" for folder in iter_folders_with_file(Path(args.dir), "index.md", args.verbose))
+    for index_md, meta in frontmatter.filter_posts(index_files, cache, typst=args.typst, katex=args.katex, tags=args.tag):
+        print(f"{index_md.parent}\t{meta.get('title', '')}")
+    cache.save()
 
-        typ.write_text("\n",encoding="utf-8")
+def publish_site(args):
+    """
+    publish subcommand function, sync a fresh hugo build into the gh-pages worktree
+    """
+    import publish
+    hugo_args = args.hugo_args[1:] if args.hugo_args[:1] == ["--"] else args.hugo_args
+    sys.exit(publish.publish(hugo_args=hugo_args, jobs=args.jobs, push=not args.no_push, v=args.verbose))
 
-    save_front_matter(arcticle_dir / "index.md",meta_data,v=True)
-    
+def images(args):
+    """
+    images subcommand function, responsive variants of article images
+    """
+    try:
+        import images
+        images.process_images(Path(args.dir), widths=args.widths, formats=args.formats, jobs=args.jobs, v=args.verbose)
+    except (ImportError, RuntimeError) as e:
+        print(e)
+        sys.exit(1)
+
+def search(args):
+    """
+    search subcommand function, build the sharded search index
+    """
+    try:
+        import searchindex
+    except ImportError as ie:
+        print(f"Failed to import module, {ie}")
+        sys.exit(1)
+    searchindex.build_index(Path(args.dir), Path(args.output), prefix=args.prefix, v=args.verbose)
+
+def orphans(args):
+    """
+    orphans subcommand function, report or prune unreferenced assets and stale typst pages
+    """
+    try:
+        import orphans as og
+    except ImportError as ie:
+        print(f"Failed to import module, {ie}")
+        sys.exit(1)
+    stale, unreferenced = og.find_orphans(Path(args.dir), Path(args.static), og.KEEP + tuple(args.keep or ()), args.verbose, args.jobs)
+    for p in stale:
+        print(f"[Orphans] stale page {p}")
+    for p in unreferenced:
+        print(f"[Orphans] unreferenced {p}")
+    size = sum(p.stat().st_size for p in stale + unreferenced)
+    print(f"[Orphans] {len(stale)} stale pages, {len(unreferenced)} unreferenced assets, {size / 1024:.1f} KiB")
+    if args.prune:
+        print(f"[Orphans] {og.prune(stale + unreferenced, args.verbose)} files removed")
+
+def data(args):
+    """
+    data subcommand function, validate projects.json, localize the remote icons and write the bundle Hugo reads
+    """
+    import json
+    try:
+        import projectdata
+    except ImportError as ie:
+        print(f"Failed to import module, {ie}")
+        sys.exit(1)
+    with open(args.input, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    errors = projectdata.validate(entries)
+    for e in errors:
+        print(f"[Data] {e}")
+    if errors:
+        print(f"[Data] {args.input}: {len(errors)} problems, nothing written")
+        sys.exit(1)
+    if args.check:
+        print(f"[Data] {args.input}: {len(entries)} projects OK")
+        return
+    fetch = projectdata.dir_fetcher(Path(args.stub)) if args.stub else None
+    projects, failures = projectdata.build_bundle(entries, fetch, args.sort, jobs=args.jobs, v=args.verbose)
+    for f in failures:
+        print(f"[Data] Failed to fetch {f}")
+    written = projectdata.write_bundle(projects, Path(args.output))
+    print(f"[Data] {len(projects)} projects, {len(projects) - len(failures)} ok, bundle {'written to' if written else 'unchanged at'} {args.output}")
 
 def ask_question(prompt: str, type: Callable, default=None):
     """
@@ -211,8 +296,59 @@ def main():
     # New subcommand
     parser_new = subparsers.add_parser("new", help="create new posts")
     parser_new.add_argument("-d","--overwrite_dir",help="Overwrite content dir")
+    parser_new.add_argument("-b","--batch",help="Create the posts listed in a .csv or .jsonl file without asking, keys are the front matter fields plus slug and body")
+    parser_new.add_argument("-j","--jobs",type=int,help="Number of posts created at once in batch mode",default=8)
     parser_new.set_defaults(func=new)
 
+    # List subcommand
+    parser_list = subparsers.add_parser("list", help="list posts filtered on their front matter")
+    parser_list.add_argument("-d","--dir",help="Content dir",default="./content/articles")
+    parser_list.add_argument("--typst",action=argparse.BooleanOptionalAction,help="only (non) typst posts",default=None)
+    parser_list.add_argument("--katex",action=argparse.BooleanOptionalAction,help="only (non) katex posts",default=None)
+    parser_list.add_argument("-t","--tag",action="append",help="only posts with this tag, can be repeated",default=[])
+    parser_list.set_defaults(func=list_posts)
+
+    # Images subcommand
+    parser_images = subparsers.add_parser("images", help="generate resized webp/avif variants of article images into static/images/responsive/ and data/images.json (build output, gitignored)")
+    parser_images.add_argument("-d","--dir",help="Content dir",default="./content")
+    parser_images.add_argument("-w","--widths",type=int,nargs="+",help="Widths of the variants",default=[480, 960, 1600])
+    parser_images.add_argument("-f","--formats",nargs="+",help="Formats of the variants",default=["webp", "avif"])
+    parser_images.add_argument("-j","--jobs",type=int,help="Number of worker processes",default=None)
+    parser_images.set_defaults(func=images)
+
+    # Search subcommand
+    parser_search = subparsers.add_parser("search", help="build the sharded search index of the articles")
+    parser_search.add_argument("-d","--dir",help="Content dir",default="./content")
+    parser_search.add_argument("-o","--output",help="Where the index is written",default="static/search")
+    parser_search.add_argument("-p","--prefix",type=int,help="Characters of latin terms used as shard key",default=1)
+    parser_search.set_defaults(func=search)
+
+    # Orphans subcommand
+    parser_orphans = subparsers.add_parser("orphans", help="find assets nothing refers to and typst pages left by earlier builds")
+    parser_orphans.add_argument("-d","--dir",help="Content dir",default="./content")
+    parser_orphans.add_argument("-s","--static",help="Static dir",default="./static")
+    parser_orphans.add_argument("-k","--keep",action="append",help="Glob of assets to keep even if unreferenced, can be given several times")
+    parser_orphans.add_argument("-p","--prune",action="store_true",help="Delete what was found",default=False)
+    parser_orphans.add_argument("-j","--jobs",type=int,help="Number of files scanned at once",default=4)
+    parser_orphans.set_defaults(func=orphans)
+
+    # Data subcommand
+    parser_data = subparsers.add_parser("data", help="validate projects.json, cache its remote icons locally and write a minified sorted bundle to data/projects.json (build output, gitignored)")
+    parser_data.add_argument("-i","--input",help="Projects file, edited by hand",default="projects.json")
+    parser_data.add_argument("-o","--output",help="Where the bundle is written, the only projects file Hugo reads",default="data/projects.json")
+    parser_data.add_argument("-s","--sort",choices=["status","name","none"],help="Order of the projects in the bundle",default="status")
+    parser_data.add_argument("-c","--check",action="store_true",help="Only validate the projects file, nothing is downloaded or written",default=False)
+    parser_data.add_argument("-j","--jobs",type=int,help="Number of icons downloaded at once",default=4)
+    parser_data.add_argument("--stub",help="Serve icon downloads from this dir (by file name) instead of the network")
+    parser_data.set_defaults(func=data)
+
+    # Publish subcommand
+    parser_publish = subparsers.add_parser("publish", help="build the site and push only the changed files to gh-pages")
+    parser_publish.add_argument("-j","--jobs",type=int,help="Files hashed and copied at once",default=8)
+    parser_publish.add_argument("--no_push",action="store_true",help="Commit to gh-pages but don't push",default=False)
+    parser_publish.add_argument("hugo_args",nargs=argparse.REMAINDER,help="Extra arguments for hugo, e.g. -- --minify")
+    parser_publish.set_defaults(func=publish_site)
+
     args = parser.parse_args()
 
     if args.verbose:
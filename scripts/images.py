@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CACHE_DIR = Path(".cache/images")
+MANIFEST_PATH = Path("data/images.json")
+# variants are build output: served from static/ (not duplicated as page resources) and gitignored
+VARIANT_ROOT = Path("static/images/responsive")
+VARIANT_URL = "/images/responsive"
+WIDTHS = (480, 960, 1600)
+FORMATS = ("webp", "avif")
+QUALITY = {"webp": 80, "avif": 55}
+RASTER_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+
+def supported_formats(formats) -> List[str]:
+    try:
+        from PIL import features
+    except ImportError as ie:
+        raise RuntimeError(f"Failed to import module, {ie}. Install Pillow to process images.")
+    return [f for f in formats if features.check(f)]
+
+def content_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def encode_variants(src: str, digest: str, widths: Tuple[int, ...], formats: Tuple[str, ...], cache_dir: str) -> dict:
+    """
+    Worker: resize one image to every width (never upscaling) and format, results go to the
+    content addressed cache. Variants already in the cache are not encoded again.
+    """
+    from PIL import Image
+
+    with Image.open(src) as im:
+        size = im.size
+        todo = [(w, fmt) for w in widths if w < size[0] for fmt in formats
+                if not os.path.exists(os.path.join(cache_dir, f"{digest}-{w}.{fmt}"))]
+        if todo:
+            im.load()
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+            for w, fmt in todo:
+                h = max(1, round(size[1] * w / size[0]))
+                out = os.path.join(cache_dir, f"{digest}-{w}.{fmt}")
+                tmp = f"{out}.{os.getpid()}.tmp"
+                im.resize((w, h), Image.LANCZOS).save(tmp, format=fmt.upper(), quality=QUALITY.get(fmt, 80))
+                os.replace(tmp, out)
+    return {"width": size[0], "height": size[1]}
+
+def article_images(folder: Path, front_matter: dict) -> List[Path]:
+    """
+    Raster images under images/ plus the cover, unless the post keeps its original cover
+    """
+    images = set()
+    image_dir = folder / "images"
+    if image_dir.is_dir():
+        for p in image_dir.rglob("*"):
+            if p.suffix.lower() in RASTER_SUFFIXES:
+                images.add(p)
+    cover = front_matter.get("cover")
+    if cover and not cover.startswith(("http://", "https://", "/")):
+        cover_path = Path(os.path.normpath(folder / cover))
+        if front_matter.get("keepOrigin", False):
+            images.discard(cover_path)
+        elif cover_path.suffix.lower() in RASTER_SUFFIXES and cover_path.is_file():
+            images.add(cover_path)
+    return sorted(images)
+
+def process_images(content_dir: Path, widths=WIDTHS, formats=FORMATS, cache_dir: Path = CACHE_DIR,
+                   manifest_path: Path = MANIFEST_PATH, jobs: Optional[int] = None, v=False,
+                   variant_root: Path = VARIANT_ROOT, variant_url: str = VARIANT_URL) -> dict:
+    """
+    Write resized variants to `variant_root`/<article>/ (served at `variant_url`) and a manifest
+    Hugo reads from data/, keyed by article then by image path, for building srcset
+    """
+    import frontmatter
+    from buildtyp import iter_folders_with_file
+
+    formats = tuple(supported_formats(formats))
+    widths = tuple(sorted(widths))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    work: List[Tuple[Path, Path, str]] = []
+    for folder in iter_folders_with_file(content_dir, "index.md", v):
+        meta = frontmatter.read_front_matter(folder / "index.md") or {}
+        for image in article_images(folder, meta):
+            work.append((folder, image, content_hash(image)))
+
+    # identical images (e.g. a cover used by several posts) are encoded once
+    unique = {digest: image for _, image, digest in work}
+    if v: print(f"[Images] {len(work)} images, {len(unique)} unique, formats {formats}, widths {widths}")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        sizes = dict(zip(unique, pool.map(encode_variants, map(str, unique.values()), unique,
+                                          [widths] * len(unique), [formats] * len(unique), [str(cache_dir)] * len(unique))))
+
+    manifest: Dict[str, Dict[str, dict]] = {}
+    written = 0
+    expected = set()
+    for folder, image, digest in work:
+        size = sizes[digest]
+        key = folder.relative_to(content_dir).as_posix()
+        variant_dir = variant_root / key
+        variants = []
+        for w in widths:
+            if w >= size["width"]:
+                continue
+            for fmt in formats:
+                cached = cache_dir / f"{digest}-{w}.{fmt}"
+                out = variant_dir / f"{image.stem}-{digest[:8]}-{w}.{fmt}"
+                if not out.exists() or out.stat().st_size != cached.stat().st_size:
+                    variant_dir.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(cached, out)
+                    written += 1
+                expected.add(out)
+                variants.append({"src": f"{variant_url}/{key}/{out.name}", "width": w, "format": fmt})
+        manifest.setdefault(key, {})[image.relative_to(folder).as_posix()] = dict(size, variants=variants)
+
+    # variants of images that changed or are gone
+    stale = [p for p in variant_root.rglob("*") if p.is_file() and p not in expected] if variant_root.is_dir() else []
+    for p in stale:
+        if v: print(f"[Images] Removing stale {p}")
+        p.unlink()
+    for d in sorted({p.parent for p in stale}, key=lambda d: len(d.parts), reverse=True):
+        while d != variant_root and d.is_dir() and not any(d.iterdir()):
+            d.rmdir()
+            d = d.parent
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    text = json.dumps(manifest, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    if not manifest_path.exists() or manifest_path.read_text(encoding="utf-8") != text:
+        manifest_path.write_text(text, encoding="utf-8")
+    print(f"[Images] {written} variants written, manifest at {manifest_path}")
+    return manifest
@@ -0,0 +1,97 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+class Recorder():
+    """
+    Collects timed stages of a run, they can be printed as a summary or saved as a Chrome trace
+    (load it in chrome://tracing or https://ui.perfetto.dev)
+    """
+    def __init__(self):
+        self.events: List[dict] = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, cat: str = "", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "cat": cat or name,
+                "ph": "X",
+                "ts": round((start - self.origin) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = {k: str(v) for k, v in args.items()}
+            with self.lock:
+                self.events.append(event)
+
+    def summary(self) -> Dict[str, Tuple[int, float]]:
+        """
+        count and total seconds of each stage category
+        """
+        totals = {}
+        for e in self.events:
+            count, total = totals.get(e["cat"], (0, 0.0))
+            totals[e["cat"]] = (count + 1, total + e["dur"] / 1e6)
+        return totals
+
+    def report(self, slowest: int = 5) -> None:
+        print("[Timing] stage                count    total(s)")
+        for cat, (count, total) in sorted(self.summary().items(), key=lambda i: -i[1][1]):
+            print(f"[Timing] {cat:<20} {count:>5} {total:>11.3f}")
+        for e in sorted(self.events, key=lambda e: -e["dur"])[:slowest]:
+            detail = ", ".join(e.get("args", {}).values())
+            print(f"[Timing] slowest: {e['name']} {detail} {e['dur'] / 1e6:.3f}s")
+
+    def write_trace(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.events.clear()
+        self.origin = time.perf_counter()
+
+RECORDER = Recorder()
+stage = RECORDER.stage
+
+def run_profiled(func: Callable, profile_path: Optional[str], *args, **kwargs):
+    """
+    Call func, under cProfile when `profile_path` is set; the stats are dumped there for pstats/snakeviz
+    """
+    if not profile_path:
+        return func(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(profile_path)
+        print(f"[Profile] Stats written to {profile_path}")
+
+def start_profiler(profile_path: str) -> Callable[[], None]:
+    """
+    For CLIs that can't wrap their command in one call, return the function stopping and dumping the profile
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        print(f"[Profile] Stats written to {profile_path}")
+    return stop
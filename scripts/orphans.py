@@ -0,0 +1,148 @@
+"""
+Reference graph of the site assets: every text file of content/, layouts/, themes/, data/ and the
+generated public/ is scanned (with the tablertrimer engine) for paths ending in an asset suffix,
+the references are resolved against the bundle of the referring file and static/, and every asset
+nothing points to is an orphan. Typst pages the build manifest no longer lists are stale outputs.
+"""
+import fnmatch
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+ASSET_SUFFIXES = ("png", "jpe?g", "gif", "svg", "webp", "avif", "ico", "bmp", "tiff?", "pdf", "zip",
+                  "mp4", "webm", "mp3", "woff2?", "ttf", "otf", "eot", "css", "js", "json", "txt")
+PATH_CHAR = r"""[^\s"'()<>\[\]{},;=*|\\`]"""
+# a path only starts right after a delimiter and is bounded, so long runs without delimiters (base64 blobs)
+# are tried once instead of at every offset; data: uris are consumed whole (possessively) and dropped
+REFERENCE_PATTERN = r"""(?<!%s)(?:data:[^\s"'()<>]*+|%s{1,256}\.(?:%s)\b)""" % (PATH_CHAR, PATH_CHAR, "|".join(ASSET_SUFFIXES))
+SCAN_DIRS = ("content", "layouts", "themes", "data", "public")
+CONFIG_FILES = ("hugo.toml", "config.toml")
+# mimetypes does not know these as text
+EXTRA_TEXT_SUFFIXES = {".typ", ".json", ".toml", ".yaml", ".yml", ".js", ".svg"}
+# the page sources themselves are no assets
+SOURCE_NAMES = {"index.md", "_index.md", "main.typ"}
+SOURCE_SUFFIXES = {".md", ".typ", ".bib"}
+# fetched by the theme or by hosting without appearing as a path in any file
+KEEP = ("favicon*", "robots.txt", "CNAME", "search/*", "**/images/pages.svg", "**/images/pages.json")
+PAGE_PATTERN = re.compile(r"page-\d+\.svg")
+
+def iter_reference_files(root: Path) -> Iterator[str]:
+    from tablertrimer import is_text_file
+
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            path = os.path.join(folder, name)
+            if os.path.splitext(name)[1].lower() in EXTRA_TEXT_SUFFIXES or is_text_file(path):
+                yield path
+
+def iter_assets(content_dir: Path, static_dir: Path) -> Iterator[Path]:
+    """
+    Every file of static/ and every non source file of the content bundles
+    """
+    if static_dir.is_dir():
+        yield from (p for p in static_dir.rglob("*") if p.is_file())
+    if content_dir.is_dir():
+        for p in content_dir.rglob("*"):
+            if p.is_file() and p.name not in SOURCE_NAMES and p.suffix.lower() not in SOURCE_SUFFIXES:
+                yield p
+
+def resolve(ref: str, referrer: Path, content_dir: Path, static_dir: Path) -> List[Path]:
+    """
+    The files a reference may mean, relative to the referrer or, for site absolute urls, to static/ and content/
+    """
+    from urllib.parse import unquote, urlsplit
+
+    url = urlsplit(ref)
+    if url.scheme or url.netloc:
+        return []
+    path = unquote(url.path)
+    if path.startswith("/"):
+        bases = [static_dir, content_dir]
+        path = path.lstrip("/")
+    else:
+        bases = [referrer.parent, static_dir]
+    return [Path(os.path.normpath(b / path)) for b in bases]
+
+def reference_graph(roots: Iterable[Path], content_dir: Path, static_dir: Path, verbose=False, jobs: int = 1) -> Tuple[Dict[Path, Set[Path]], Set[str]]:
+    """
+    Map every referenced file to the files referring to it, also return the names of the
+    references that could not be resolved to a file (those are matched on the file name)
+    """
+    from tablertrimer import index_files
+
+    files = [f for root in roots if root.exists() for f in ([str(root)] if root.is_file() else iter_reference_files(root))]
+    graph: Dict[Path, Set[Path]] = {}
+    unresolved = set()
+    for referrer, refs in index_files(files, REFERENCE_PATTERN, verbose=verbose, jobs=jobs).items():
+        referrer = Path(referrer)
+        for ref in refs:
+            if ref.startswith("data:"):
+                continue
+            targets = [t for t in resolve(ref, referrer, content_dir, static_dir) if t.is_file()]
+            for t in targets:
+                graph.setdefault(t, set()).add(referrer)
+            if not targets:
+                unresolved.add(ref.rsplit("/", 1)[-1])
+    return graph, unresolved
+
+def stale_pages(manifest: dict) -> List[Path]:
+    """
+    Typst outputs left by earlier builds: page svgs of a built article the manifest does not list
+    """
+    stale = []
+    for key, entry in manifest.get("articles", {}).items():
+        image_dir = Path(key) / "images"
+        if not image_dir.is_dir():
+            continue
+        live = set(entry.get("pages", []))
+        stale.extend(p for p in image_dir.iterdir() if PAGE_PATTERN.fullmatch(p.name) and p.name not in live)
+    return sorted(stale)
+
+def live_pages(manifest: dict) -> Set[Path]:
+    return {Path(os.path.normpath(Path(key) / "images" / name)) for key, entry in manifest.get("articles", {}).items() for name in entry.get("pages", [])}
+
+def kept(path: Path, static_dir: Path, keep: Iterable[str]) -> bool:
+    rel = path.relative_to(static_dir).as_posix() if path.is_relative_to(static_dir) else path.as_posix()
+    return any(fnmatch.fnmatch(rel, k) or fnmatch.fnmatch(path.name, k) for k in keep)
+
+def find_orphans(content_dir: Path = Path("content"), static_dir: Path = Path("static"), keep: Iterable[str] = KEEP,
+                 verbose=False, jobs: int = 1) -> Tuple[List[Path], List[Path]]:
+    """
+    Return (stale typst pages, unreferenced assets)
+    """
+    from buildtyp import load_manifest
+
+    manifest = load_manifest()
+    stale = stale_pages(manifest)
+    roots = [Path(d) for d in SCAN_DIRS] + [Path(c) for c in CONFIG_FILES]
+    graph, unresolved = reference_graph(roots, content_dir, static_dir, verbose, jobs)
+    # pages are loaded by the theme from the manifest listing, not through a path in a file
+    live = live_pages(manifest)
+    stale_set = set(stale)
+    orphans = []
+    for asset in iter_assets(content_dir, static_dir):
+        asset = Path(os.path.normpath(asset))
+        if asset in stale_set or asset in live or kept(asset, static_dir, keep):
+            continue
+        if PAGE_PATTERN.fullmatch(asset.name) and asset.parent.parent.as_posix() not in manifest.get("articles", {}):
+            # an article never built here, its pages can't be told apart
+            continue
+        if asset in graph or asset.name in unresolved:
+            continue
+        orphans.append(asset)
+    return stale, sorted(orphans)
+
+def prune(paths: Iterable[Path], verbose=False) -> int:
+    count = 0
+    for p in paths:
+        p.unlink()
+        count += 1
+        if verbose: print(f"[Orphans] Removed {p}")
+        # drop the folders emptied on the way, but never the roots
+        parent = p.parent
+        while parent.name not in ("", "static", "content", "images") and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+    return count
@@ -0,0 +1,138 @@
+"""
+Post scaffolding shared by `hpcli new`, its batch mode and other scripts:
+
+    from posts import create_posts
+    create_posts([{"title": "Hello", "tags": ["a"], "body": "..."}], Path("content/articles"), jobs=8)
+"""
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+META_DATA = {
+    "title": ("Title of the new post",str),
+    "description": ("Description of the post",str),
+    "tags": ("Tags of the post",list,[]),
+    "categories": ("Category of the post", list,[]),
+    "date": ("Date of the post", str, datetime.now().strftime("%Y-%m-%d")),
+    "withToc": ("Show table of contents",bool,True),
+    "cover": ("Cover images of the post",str,""),
+    "keepOrigin":("Keep the origin cover img instead of resize it.(May cause long-loading-time issue)",bool,False),
+    "typst":("Enable typst for the post",bool,False),
+    "noWordTime":("Don't show WrodCount and reading time.(Will be true while typst is sat to true)",bool,False),
+    "katex":("Enable Katex for the post",bool,False)
+}
+
+# keys of a batch entry that are not front matter
+EXTRA_KEYS = {"slug", "body"}
+TRUE_VALUES = {"y", "yes", "true", "1"}
+FALSE_VALUES = {"n", "no", "false", "0", ""}
+
+def slugify(title: str) -> str:
+    return title.strip().lower().replace(" ", "-")
+
+def coerce(key: str, value, type):
+    """
+    Convert a manifest value (CSV gives only strings) to the type of the META_DATA field
+    """
+    if type == bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).strip().lower() in TRUE_VALUES:
+            return True
+        if str(value).strip().lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f"{key}: expected y/n, got {value!r}")
+    if type == list:
+        if isinstance(value, list):
+            return [str(i) for i in value]
+        return [i.strip() for i in str(value).split(",") if i.strip()]
+    return str(value)
+
+def post_meta(entry: dict) -> dict:
+    """
+    Front matter of a batch entry: META_DATA defaults, typed values, typst posts without toc and word count.
+    Unknown keys are kept as they are.
+    """
+    meta = {}
+    for k, field in META_DATA.items():
+        if k in entry and entry[k] is not None:
+            meta[k] = coerce(k, entry[k], field[1])
+        elif len(field) > 2:
+            meta[k] = field[2]
+        elif k != "title":
+            meta[k] = ""
+    if not meta.get("title", "").strip():
+        raise ValueError("title: missing")
+    for k, value in entry.items():
+        if k not in META_DATA and k not in EXTRA_KEYS:
+            meta[k] = value
+    if meta["typst"]:
+        meta["noWordTime"] = True
+        meta["withToc"] = False
+    return meta
+
+def plan_posts(entries: Iterable[dict], content_dir: Path) -> Tuple[List[Tuple[Path, dict, str]], List[str]]:
+    """
+    Validate every entry before anything is created, slugs are checked against one listing of `content_dir`
+    and against each other. Return (folder, front matter, body) of each post and the problems found.
+    """
+    existing = set(os.listdir(content_dir)) if content_dir.is_dir() else set()
+    planned = {}
+    errors = []
+    for i, entry in enumerate(entries):
+        try:
+            meta = post_meta(entry)
+        except ValueError as e:
+            errors.append(f"entry {i}: {e}")
+            continue
+        slug = str(entry.get("slug") or slugify(meta["title"]))
+        if not slug or slug in (".", "..") or "/" in slug or os.sep in slug:
+            errors.append(f"entry {i}: invalid slug {slug!r}")
+        elif slug in existing:
+            errors.append(f"entry {i}: post {slug} already exists")
+        elif slug in planned:
+            errors.append(f"entry {i}: slug {slug} is also used by entry {planned[slug][0]}")
+        else:
+            planned[slug] = (i, meta, str(entry.get("body") or ""))
+    return [(content_dir / slug, meta, body) for slug, (_, meta, body) in planned.items()], errors
+
+def create_post(folder: Path, meta: dict, body: str = "") -> Path:
+    """
+    Make the post folder with its images/ dir, index.md and for typst posts main.typ (which then gets the body)
+    """
+    from frontmatter import dump_front_matter
+
+    os.mkdir(folder)
+    os.mkdir(folder / "images")
+    if meta.get("typst", False):
+        (folder / "main.typ").write_text(body or "\n", encoding="utf-8")
+        body = ""
+    (folder / "index.md").write_text(dump_front_matter(meta) + body, encoding="utf-8")
+    return folder
+
+def create_posts(entries: Iterable[dict], content_dir: Path, jobs: int = 8, v=False) -> List[Path]:
+    """
+    Create a batch of posts, nothing is created unless every entry is valid (ValueError listing the problems)
+    """
+    posts, errors = plan_posts(entries, content_dir)
+    if errors:
+        raise ValueError("\n".join(errors))
+    content_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        created = list(pool.map(lambda p: create_post(*p), posts))
+    if v:
+        for folder in created: print(f"[Post] Created {folder}")
+    return created
+
+def read_entries(path: Path) -> List[dict]:
+    """
+    Entries of a .csv (header row = keys, lists comma separated) or .jsonl manifest
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            return [{k: v for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,177 @@
+"""
+projects.json: schema validation, remote icons cached as local assets and a minified, pre-sorted bundle
+written to data/projects.json, the only copy Hugo reads
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# hand edited, outside data/ so that Hugo only sees the bundle
+DATA_PATH = Path("projects.json")
+BUNDLE_PATH = Path("data/projects.json")
+CACHE_DIR = Path(".cache/projects")
+ICON_DIR = Path("static/images/projects")
+ICON_URL = "/images/projects"
+ICON_SIZE = 128
+STATUS_ORDER = ("Working", "Maintained", "Paused", "Archived")
+
+# field: (type, required)
+SCHEMA = {
+    "name": (str, True),
+    "description": (str, True),
+    "link": (str, True),
+    "icon": (str, False),
+    "iconUrl": (str, False),
+    "tag": (list, False),
+    "status": (str, False),
+}
+
+Fetcher = Callable[[str], bytes]
+
+def is_remote(url: str) -> bool:
+    return urlsplit(url).scheme in ("http", "https")
+
+def validate(entries) -> List[str]:
+    """
+    Check the projects against SCHEMA, return the problems found (empty when valid)
+    """
+    if not isinstance(entries, list):
+        return ["projects: expected a list of projects"]
+    errors = []
+    names = set()
+    for i, entry in enumerate(entries):
+        where = f"projects[{i}]"
+        if not isinstance(entry, dict):
+            errors.append(f"{where}: expected an object")
+            continue
+        for field, (kind, required) in SCHEMA.items():
+            if field not in entry:
+                if required: errors.append(f"{where}.{field}: missing")
+            elif not isinstance(entry[field], kind):
+                errors.append(f"{where}.{field}: expected {kind.__name__}, got {type(entry[field]).__name__}")
+            elif kind is str and required and not entry[field].strip():
+                errors.append(f"{where}.{field}: empty")
+        for field in entry.keys() - SCHEMA.keys():
+            errors.append(f"{where}.{field}: unknown field")
+        if isinstance(entry.get("tag"), list) and not all(isinstance(t, str) for t in entry["tag"]):
+            errors.append(f"{where}.tag: expected a list of str")
+        if isinstance(entry.get("link"), str) and not is_remote(entry["link"]) and not entry["link"].startswith("/"):
+            errors.append(f"{where}.link: not an http(s) or site url, {entry['link']}")
+        name = entry.get("name")
+        if isinstance(name, str):
+            if name in names: errors.append(f"{where}.name: duplicate, {name}")
+            names.add(name)
+    return errors
+
+def urllib_fetch(url: str, timeout: float = 15) -> bytes:
+    from urllib.request import Request, urlopen
+
+    with urlopen(Request(url, headers={"User-Agent": "hpcli"}), timeout=timeout) as r:
+        return r.read()
+
+def dir_fetcher(directory: Path) -> Fetcher:
+    """
+    Offline fetcher serving every url from `directory`/<last path segment>, for air-gapped builds
+    """
+    def fetch(url: str) -> bytes:
+        return (directory / (urlsplit(url).path.rsplit("/", 1)[-1] or "index")).read_bytes()
+    return fetch
+
+def cached_fetch(url: str, fetch: Fetcher, cache_dir: Path = CACHE_DIR) -> bytes:
+    """
+    Raw downloads are kept by url hash, an icon is only downloaded once
+    """
+    path = cache_dir / hashlib.sha256(url.encode()).hexdigest()
+    if path.exists():
+        return path.read_bytes()
+    data = fetch(url)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return data
+
+def localize_icon(data: bytes, url: str, icon_dir: Path = ICON_DIR, size: int = ICON_SIZE) -> str:
+    """
+    Store an icon as static/images/projects/<hash>.<ext>, scaled down to `size` when Pillow is there.
+    Return the file name.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    suffix = os.path.splitext(urlsplit(url).path)[1].lower() or ".png"
+    try:
+        import io
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None and suffix not in (".svg", ".ico"):
+        name = f"{digest}-{size}.png"
+        if not (icon_dir / name).exists():
+            with Image.open(io.BytesIO(data)) as im:
+                im = im.convert("RGBA")
+                im.thumbnail((size, size), Image.LANCZOS)
+                icon_dir.mkdir(parents=True, exist_ok=True)
+                im.save(icon_dir / name, format="PNG", optimize=True)
+        return name
+    name = f"{digest}{suffix}"
+    if not (icon_dir / name).exists():
+        icon_dir.mkdir(parents=True, exist_ok=True)
+        (icon_dir / name).write_bytes(data)
+    return name
+
+def sort_key(order: str):
+    if order == "name":
+        return lambda e: e["name"].casefold()
+    if order == "status":
+        rank = {s: i for i, s in enumerate(STATUS_ORDER)}
+        return lambda e: rank.get(e.get("status"), len(rank))
+    return None
+
+def build_bundle(entries: List[dict], fetch: Optional[Fetcher] = None, order: str = "status", icon_dir: Path = ICON_DIR,
+                 cache_dir: Path = CACHE_DIR, jobs: int = 4, v=False) -> Tuple[List[dict], List[str]]:
+    """
+    Replace remote icons by local copies (the original url goes to iconUrl) and sort the projects.
+    A failed download leaves the remote icon in place. Return (projects, failures).
+    """
+    fetch = fetch or urllib_fetch
+    remote = sorted({e["icon"] for e in entries if is_remote(e.get("icon", ""))})
+    local: Dict[str, str] = {}
+    failures = []
+
+    def get(url):
+        return localize_icon(cached_fetch(url, fetch, cache_dir), url, icon_dir)
+
+    if remote:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = {url: pool.submit(get, url) for url in remote}
+        for url, future in futures.items():
+            try:
+                local[url] = f"{ICON_URL}/{future.result()}"
+                if v: print(f"[Data] {url} -> {local[url]}")
+            except Exception as e:
+                failures.append(f"{url}: {e}")
+
+    projects = []
+    for e in entries:
+        e = dict(e)
+        if e.get("icon") in local:
+            e["iconUrl"] = e["icon"]
+            e["icon"] = local[e["icon"]]
+        projects.append(e)
+    key = sort_key(order)
+    if key is not None:
+        projects.sort(key=key)
+    return projects, failures
+
+def write_bundle(projects: List[dict], path: Path) -> bool:
+    text = json.dumps(projects, ensure_ascii=False, separators=(",", ":"))
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+    return True
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+WORKTREE = Path("public")
+STAGING = Path(".cache/publish/staging")
+HASH_CACHE = Path(".cache/publish/hashes.json")
+BRANCH = "gh-pages"
+
+def git(*args, cwd=None, check=True, capture=False) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=cwd, check=check, capture_output=capture, text=True)
+
+def prepare_worktree(worktree: Path = WORKTREE, branch: str = BRANCH, remote: str = "origin", v=False) -> None:
+    """
+    Keep the gh-pages worktree between publishes, only move it to the remote head.
+    Files that did not change on the branch stay untouched on disk.
+    """
+    git("fetch", remote, branch)
+    if (worktree / ".git").exists():
+        if v: print(f"[Publish] Reusing worktree {worktree}")
+        git("checkout", "-B", branch, f"{remote}/{branch}", cwd=worktree, capture=True)
+        git("reset", "--hard", f"{remote}/{branch}", cwd=worktree, capture=True)
+    else:
+        print(f"[Publish] Checking out {branch} branch into {worktree}")
+        if worktree.exists():
+            shutil.rmtree(worktree)
+        git("worktree", "prune")
+        git("worktree", "add", "-B", branch, str(worktree), f"{remote}/{branch}")
+
+def build_site(staging: Path = STAGING, hugo_args: List[str] = (), v=False) -> None:
+    print("[Publish] Generating site")
+    staging.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["hugo", "--destination", str(staging), "--cleanDestinationDir", *hugo_args], check=True,
+                   stdout=None if v else subprocess.DEVNULL)
+
+def list_files(root: Path) -> Dict[str, os.stat_result]:
+    """
+    Files below root by posix relative path, only the worktree's .git (a file in a worktree) is left out,
+    other dot entries like .well-known/ or .nojekyll are part of the site
+    """
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        if rel == ".":
+            dirnames[:] = [d for d in dirnames if d != ".git"]
+            filenames = [f for f in filenames if f != ".git"]
+        for f in filenames:
+            path = os.path.join(dirpath, f)
+            files[Path(os.path.relpath(path, root)).as_posix()] = os.stat(path)
+    return files
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_hash_cache(path: Path = HASH_CACHE) -> Dict[str, list]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_hash_cache(cache: Dict[str, list], path: Path = HASH_CACHE) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache), encoding="utf-8")
+    os.replace(tmp, path)
+
+def diff_trees(staging: Path, worktree: Path, jobs: int, cache: Dict[str, list]) -> Tuple[List[str], List[str]]:
+    """
+    Files of staging that are new or differ in content from the worktree, and worktree files gone from staging.
+    Worktree hashes are cached on mtime and size, staging files are only hashed when the sizes match.
+    """
+    new_files = list_files(staging)
+    old_files = list_files(worktree)
+    removed = sorted(set(old_files) - set(new_files))
+    candidates = []
+    changed = []
+    for rel, st in new_files.items():
+        old = old_files.get(rel)
+        if old is None or old.st_size != st.st_size:
+            changed.append(rel)
+        else:
+            candidates.append(rel)
+
+    def worktree_hash(rel):
+        st = old_files[rel]
+        hit = cache.get(rel)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            return hit[2]
+        digest = file_hash(worktree / rel)
+        cache[rel] = [st.st_mtime_ns, st.st_size, digest]
+        return digest
+
+    def differs(rel):
+        return file_hash(staging / rel) != worktree_hash(rel)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        changed += [rel for rel, d in zip(candidates, pool.map(differs, candidates)) if d]
+    for rel in removed:
+        cache.pop(rel, None)
+    return sorted(changed), removed
+
+def sync_trees(staging: Path, worktree: Path, changed: List[str], removed: List[str], jobs: int, cache: Dict[str, list]) -> None:
+    def copy(rel):
+        dst = worktree / rel
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.tmp")
+        shutil.copy2(staging / rel, tmp)
+        os.replace(tmp, dst)
+        return rel
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for rel in pool.map(copy, changed):
+            cache.pop(rel, None)
+    for rel in removed:
+        (worktree / rel).unlink()
+    # drop the dirs emptied by removals
+    for rel in removed:
+        parent = (worktree / rel).parent
+        while parent != worktree and parent.exists() and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+
+def publish(worktree: Path = WORKTREE, staging: Path = STAGING, hugo_args: List[str] = (), jobs: int = 8,
+            push: bool = True, remote: str = "origin", branch: str = BRANCH, v=False) -> int:
+    if git("status", "-s", capture=True).stdout.strip():
+        print("The working directory is dirty. Please commit any pending changes.")
+        return 1
+
+    prepare_worktree(worktree, branch, remote, v)
+    build_site(staging, hugo_args, v)
+
+    cache = load_hash_cache()
+    changed, removed = diff_trees(staging, worktree, jobs, cache)
+    print(f"[Publish] {len(changed)} files changed, {len(removed)} removed")
+    if v:
+        for rel in changed:
+            print(f"[Publish] + {rel}")
+        for rel in removed:
+            print(f"[Publish] - {rel}")
+    sync_trees(staging, worktree, changed, removed, jobs, cache)
+    save_hash_cache(cache)
+
+    git("add", "--all", cwd=worktree)
+    if git("diff", "--cached", "--quiet", cwd=worktree, check=False).returncode == 0:
+        print("[Publish] Nothing to publish")
+        return 0
+    print(f"[Publish] Updating {branch} branch")
+    git("commit", "-q", "-m", "Publishing to gh-pages (hpcli publish)", cwd=worktree)
+    if push:
+        print("[Publish] Push to origin")
+        git("push", remote, branch, cwd=worktree)
+    return 0
@@ -0,0 +1,200 @@
+"""
+Search index for the site, an inverted index split into small shards by term prefix so that
+the browser only fetches the shards of the terms typed in.
+
+Output layout (under static/search/ by default):
+    meta.json           {"version", "prefix", "shards": [...], "docs": "docs.json"}
+    docs.json           [[id, title, url, description, date, tags], ...]
+    shards/<key>.json   {term: [[id, weight], ...]}, key from shard_key()
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+OUTPUT_DIR = Path("static/search")
+STATE_PATH = Path(".cache/search/state.pickle")
+STATE_VERSION = 2
+HUGO_CONFIGS = ("hugo.toml", "config.toml")
+TITLE_WEIGHT = 5
+TAG_WEIGHT = 3
+
+CJK = "぀-ヿ㐀-䶿一-鿿豈-﫿가-힯"
+TOKEN_PATTERN = re.compile(rf"[{CJK}]+|[^\W_{CJK}]+")
+CJK_PATTERN = re.compile(rf"[{CJK}]")
+# fenced code, links targets, html tags and typst/markdown punctuation carry no words worth searching
+NOISE_PATTERN = re.compile(r"```.*?```|\]\([^)]*\)|<[^>]+>|#\w+\(|[#*_`\[\]{}()$=\\/|]", re.DOTALL)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased words; runs of CJK characters have no spaces, they become single characters and bigrams
+    """
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text.lower()):
+        if CJK_PATTERN.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif len(run) > 1:
+            tokens.append(run)
+    return tokens
+
+def shard_key(term: str, prefix: int = 1) -> str:
+    """
+    Latin terms are sharded on their first `prefix` characters, CJK ones on the block of their first codepoint
+    """
+    if term[0].isascii():
+        return re.sub(r"[^a-z0-9]", "_", term[:prefix])
+    return f"u{ord(term[0]) >> 8:02x}"
+
+def hugo_path_to_lower(configs=HUGO_CONFIGS) -> bool:
+    """
+    Hugo lowercases page paths unless disablePathToLower is set in the site config
+    """
+    import tomllib
+
+    for config in configs:
+        try:
+            with open(config, "rb") as f:
+                return not tomllib.load(f).get("disablePathToLower", False)
+        except (OSError, tomllib.TOMLDecodeError):
+            continue
+    return True
+
+def sanitize_path(path: str, to_lower: bool = True) -> str:
+    """
+    Hugo's path sanitizing: spaces become dashes, letters/digits and ./_-#+~% are kept, anything else dropped
+    """
+    path = "".join("-" if c == " " else c for c in path.strip() if c == " " or c.isalnum() or c in "./_-#+~%")
+    return path.lower() if to_lower else path
+
+def page_url(key: str, meta: dict, to_lower: bool = True) -> str:
+    """
+    Relative permalink Hugo gives the page bundle `key` (its folder relative to content/):
+    front matter `url` wins, `slug` replaces the last segment, percent-encoded like .RelPermalink
+    """
+    from urllib.parse import quote
+
+    if meta.get("url"):
+        path = "/" + str(meta["url"]).strip("/") + "/"
+        return quote(path, safe="/-_.~#+%")
+    segments = key.split("/")
+    if meta.get("slug"):
+        segments[-1] = str(meta["slug"])
+    path = sanitize_path("/" + "/".join(segments) + "/", to_lower)
+    return quote(path, safe="/-_.~#+%")
+
+def article_terms(folder: Path, meta: dict) -> Counter:
+    import frontmatter
+
+    body = frontmatter.read_body(folder / "index.md")
+    typ = folder / "main.typ"
+    if meta.get("typst", False) and typ.is_file():
+        body += "\n" + typ.read_text(encoding="utf-8")
+    terms = Counter(tokenize(NOISE_PATTERN.sub(" ", body)))
+    for t in tokenize(f"{meta.get('title', '')} {meta.get('description', '')}"):
+        terms[t] += TITLE_WEIGHT
+    for tag in (meta.get("tags") or []) + (meta.get("categories") or []):
+        for t in tokenize(str(tag)):
+            terms[t] += TAG_WEIGHT
+    return terms
+
+def article_hash(folder: Path) -> str:
+    h = hashlib.sha256()
+    for name in ("index.md", "main.typ"):
+        p = folder / name
+        if p.is_file():
+            h.update(name.encode())
+            h.update(p.read_bytes())
+    return h.hexdigest()
+
+def load_state(path: Path = STATE_PATH) -> dict:
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") == STATE_VERSION:
+            return state
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    return {"version": STATE_VERSION, "articles": {}}
+
+def save_state(state: dict, path: Path = STATE_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def write_if_changed(path: Path, data) -> bool:
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+    return True
+
+def build_index(content_dir: Path, output_dir: Path = OUTPUT_DIR, prefix: int = 1, state_path: Path = STATE_PATH,
+                section: str = "articles", v=False) -> Tuple[int, int]:
+    """
+    (Re)index the articles of `section`, only articles whose index.md/main.typ hash changed are tokenized again.
+    Shards whose content did not change are not rewritten. Return (articles reindexed, files written).
+    """
+    import frontmatter
+    from buildtyp import iter_folders_with_file
+
+    state = load_state(state_path)
+    to_lower = hugo_path_to_lower()
+    articles: Dict[str, dict] = state["articles"]
+    seen = set()
+    reindexed = 0
+    for folder in iter_folders_with_file(content_dir / section, "index.md", v):
+        meta = frontmatter.read_front_matter(folder / "index.md") or {}
+        if meta.get("draft", False):
+            continue
+        key = folder.relative_to(content_dir).as_posix()
+        seen.add(key)
+        digest = article_hash(folder)
+        entry = articles.get(key)
+        if entry is not None and entry["hash"] == digest:
+            continue
+        if v: print(f"[Search] Indexing {key}")
+        articles[key] = {
+            "hash": digest,
+            "doc": [str(meta.get("title", key)), page_url(key, meta, to_lower), str(meta.get("description", "")),
+                    str(meta.get("date", "")), [str(t) for t in meta.get("tags") or []]],
+            "terms": dict(article_terms(folder, meta)),
+        }
+        reindexed += 1
+    for key in set(articles) - seen:
+        if v: print(f"[Search] Dropping {key}")
+        del articles[key]
+
+    # ids depend only on the articles: ordered by date then path, so new posts usually just append
+    ordered = sorted(articles.items(), key=lambda item: (item[1]["doc"][3], item[0]))
+    shards: Dict[str, Dict[str, List[List[int]]]] = {}
+    for doc_id, (_, entry) in enumerate(ordered):
+        for term, weight in entry["terms"].items():
+            shards.setdefault(shard_key(term, prefix), {}).setdefault(term, []).append([doc_id, weight])
+
+    written = 0
+    shard_dir = output_dir / "shards"
+    for name, postings in shards.items():
+        written += write_if_changed(shard_dir / f"{name}.json", postings)
+    if shard_dir.is_dir():
+        for stale in shard_dir.glob("*.json"):
+            if stale.stem not in shards:
+                stale.unlink()
+                written += 1
+    docs = [[doc_id, *entry["doc"]] for doc_id, (_, entry) in enumerate(ordered)]
+    written += write_if_changed(output_dir / "docs.json", docs)
+    version = hashlib.sha256("".join(sorted(e["hash"] for e in articles.values())).encode()).hexdigest()[:16]
+    written += write_if_changed(output_dir / "meta.json", {"version": version, "prefix": prefix, "shards": sorted(shards), "docs": "docs.json"})
+
+    save_state(state, state_path)
+    print(f"[Search] {len(articles)} articles, {reindexed} reindexed, {len(shards)} shards, {written} files written to {output_dir}")
+    return reindexed, written
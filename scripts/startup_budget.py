@@ -0,0 +1,74 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# milliseconds `python <script> --help` may take, interpreter startup included.
+# Hooks and editor integrations run these often, raise a budget only with a reason.
+BUDGETS = {
+    "buildtypc.py": 80,
+    "hpcli.py": 100,
+    "buildtyp.py": 150,
+    "tcli.py": 200,
+}
+
+def parse_importtime(stderr: str) -> List[Tuple[int, str]]:
+    """
+    (cumulative us, module) of the top level imports from `python -X importtime` output
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            imports.append((int(cumulative), name.strip()))
+    return imports
+
+def measure(script: str, runs: int) -> float:
+    """
+    Best wall time of `--help` in ms over `runs` runs, timed without -X importtime which has a cost of its own
+    """
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        r = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script), "--help"], capture_output=True, text=True)
+        best = min(best, (time.perf_counter() - start) * 1000)
+        if r.returncode != 0:
+            raise RuntimeError(f"{script} --help failed:\n{r.stderr[-2000:]}")
+    return best
+
+def import_profile(script: str) -> List[Tuple[int, str]]:
+    """
+    Import profile of one `--help` run, only taken to explain a script over its budget
+    """
+    r = subprocess.run([sys.executable, "-X", "importtime", os.path.join(SCRIPT_DIR, script), "--help"],
+                       capture_output=True, text=True)
+    return parse_importtime(r.stderr)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fail when a CLI's --help exceeds its startup budget")
+    parser.add_argument('-r', '--runs', type=int, default=5, help="Runs per script, the best one counts")
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help="Multiply every budget, for slow or shared machines (CI runs with 1.5)")
+    parser.add_argument('scripts', nargs='*', help="Scripts to check, all budgeted ones by default")
+    args = parser.parse_args()
+
+    failed = []
+    budgets: Dict[str, int] = {s: BUDGETS[s] for s in args.scripts} if args.scripts else BUDGETS
+    for script, budget in budgets.items():
+        elapsed = measure(script, args.runs)
+        limit = budget * args.scale
+        status = "OK" if elapsed <= limit else "OVER BUDGET"
+        print(f"[Startup] {script:<14} {elapsed:7.1f}ms / {limit:.0f}ms {status}")
+        if status != "OK":
+            failed.append(script)
+            for us, name in sorted(import_profile(script), reverse=True)[:8]:
+                print(f"[Startup]     {us / 1000:7.1f}ms {name}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
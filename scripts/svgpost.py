@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# typst paints text black and page backgrounds white, dropping them lets the theme colour the page
+FILL_PATTERN = re.compile(r'fill="(?:#ffffff|#000000)"')
+FILL_MAX_LEN = len('fill="#ffffff"')
+
+CHUNK_SIZE = 1 << 16
+
+def stream_sub(file_path: Path, pattern: re.Pattern, repl: str, max_len: int, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Run `pattern.sub` over a file chunk by chunk, `max_len` is the longest text the pattern can match.
+    The result goes to a temp file that only replaces the original (atomically) when something matched,
+    so untouched files keep their content and mtime.
+    Return the number of substitutions.
+    """
+    count = 0
+    fd, tmp = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with open(file_path, "r", encoding="utf-8", newline="") as src, os.fdopen(fd, "w", encoding="utf-8", newline="") as dst:
+            carry = ""
+            while True:
+                chunk = src.read(chunk_size)
+                buf = carry + chunk
+                # a match starting before `cut` is complete within buf, later ones may continue in the next chunk
+                cut = len(buf) if not chunk else max(0, len(buf) - max_len + 1)
+                emitted = 0
+                for m in pattern.finditer(buf):
+                    if m.start() >= cut:
+                        break
+                    dst.write(buf[emitted:m.start()])
+                    dst.write(m.expand(repl))
+                    emitted = m.end()
+                    count += 1
+                end = max(cut, emitted)
+                dst.write(buf[emitted:end])
+                carry = buf[end:]
+                if not chunk:
+                    break
+        if count:
+            os.chmod(tmp, os.stat(file_path).st_mode & 0o7777)
+            os.replace(tmp, file_path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return count
+
+def strip_fill_attributes(file_path: Path, v=False) -> bool:
+    """
+    Remove the hard coded black/white fills of a typst svg, return whether the file was rewritten
+    """
+    count = stream_sub(file_path, FILL_PATTERN, " ", FILL_MAX_LEN)
+    if v: print(f"[SVG] {file_path}: {count} fill attr removed")
+    return count > 0
+
+SPRITE_NAME = "pages.svg"
+SPRITE_INDEX = "pages.json"
+
+ROOT_PATTERN = re.compile(r'<svg\b([^>]*)>(.*)</svg>\s*\Z', re.DOTALL)
+DEFS_PATTERN = re.compile(r'<defs\b[^>]*>(.*?)</defs>', re.DOTALL)
+# typst never nests elements of the same kind inside a definition (symbols hold paths, clip paths hold paths)
+DEF_PATTERN = re.compile(r'<(\w+)\b[^>]*?\bid="([^"]+)"[^>]*?(?:/>|>.*?</\1>)', re.DOTALL)
+ATTR_PATTERN = re.compile(r'([\w:-]+)="([^"]*)"')
+ID_ATTR_PATTERN = re.compile(r'\bid="[^"]+"')
+
+def page_parts(text: str) -> Tuple[dict, Dict[str, str], str]:
+    """
+    Split a typst page into its root attributes, its definitions by id and the drawing itself
+    """
+    m = ROOT_PATTERN.search(text)
+    if m is None:
+        raise ValueError("not an svg document")
+    attrs = dict(ATTR_PATTERN.findall(m.group(1)))
+    defs = {}
+    for block in DEFS_PATTERN.findall(m.group(2)):
+        for d in DEF_PATTERN.finditer(block):
+            defs[d.group(2)] = d.group(0)
+    return attrs, defs, DEFS_PATTERN.sub("", m.group(2))
+
+def rename_refs(text: str, renames: Dict[str, str]) -> str:
+    if not renames:
+        return text
+    pattern = re.compile(r'#(%s)(?=["\)])' % "|".join(map(re.escape, renames)))
+    return pattern.sub(lambda m: "#" + renames[m.group(1)], text)
+
+def merge_pages(pages: List[Path], out_dir: Path, v=False) -> List[Path]:
+    """
+    Merge typst pages into one sprite `out_dir/pages.svg`, every page a `<symbol id="page-N">` sharing one `<defs>`.
+    Typst names glyphs after a hash of their outline, so equal ids are the same glyph and kept once;
+    an id reused for a different definition is renamed in the page using it.
+    `out_dir/pages.json` lists the symbols with their size, so the template can create
+    `<svg viewBox><use href="pages.svg#page-N"/></svg>` as the reader scrolls.
+    Return the written files.
+    """
+    shared: Dict[str, str] = {}
+    symbols = []
+    index = []
+    root = {}
+    for n, page in enumerate(sorted(pages, key=lambda p: (len(p.name), p.name)), start=1):
+        attrs, defs, body = page_parts(page.read_text(encoding="utf-8"))
+        root = root or {k: val for k, val in attrs.items() if k.startswith("xmlns")}
+        renames = {}
+        for def_id, text in defs.items():
+            if shared.get(def_id, text) != text:
+                i = 1
+                while f"{def_id}-{i}" in shared and shared[f"{def_id}-{i}"] != text:
+                    i += 1
+                renames[def_id] = f"{def_id}-{i}"
+        for def_id, text in defs.items():
+            new_id = renames.get(def_id, def_id)
+            shared.setdefault(new_id, ID_ATTR_PATTERN.sub(f'id="{new_id}"', rename_refs(text, renames), count=1))
+        view_box = attrs.get("viewBox", "")
+        symbols.append(f'<symbol id="page-{n}" class="{attrs.get("class", "typst-doc")}" viewBox="{view_box}">'
+                       f'{rename_refs(body, renames)}</symbol>')
+        index.append({"id": f"page-{n}", "viewBox": view_box, "width": attrs.get("width"), "height": attrs.get("height")})
+        if v and renames: print(f"[SVG] {page}: {len(renames)} colliding ids renamed")
+
+    xmlns = " ".join(f'{k}="{val}"' for k, val in root.items()) or 'xmlns="http://www.w3.org/2000/svg"'
+    sprite = out_dir / SPRITE_NAME
+    manifest = out_dir / SPRITE_INDEX
+    for path, content in (
+        (sprite, f'<svg {xmlns}>\n<defs>\n{"".join(shared.values())}\n</defs>\n{"".join(symbols)}\n</svg>\n'),
+        (manifest, json.dumps({"sprite": SPRITE_NAME, "pages": index}, separators=(",", ":"))),
+    ):
+        fd, tmp = tempfile.mkstemp(dir=out_dir, prefix=f".{path.name}.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    if v: print(f"[SVG] {len(index)} pages merged into {sprite}, {len(shared)} shared definitions")
+    return [sprite, manifest]
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
-from typing import Tuple,Dict,List
+from typing import Tuple,Dict,List,Optional
 import os
 import re
-import mimetypes
+import mmap
+from functools import lru_cache
 
 @dataclass
 class CSSCompat():
@@ -10,41 +11,110 @@ class CSSCompat():
     fontfaces:List[str]
     ti_classes:Dict[str,str]
 
+    def icon(self, name:str) -> Optional[str]:
+        """
+        Properties of an icon class, `name` with or without the ti- prefix
+        """
+        if name != "ti" and not name.startswith("ti-"):
+            name = f"ti-{name}"
+        return self.ti_classes.get(f".{name}:before")
+
+CSS_INDEX_DIR = ".cache/tablertrimer"
+
+@lru_cache(maxsize=None)
+def _is_text_suffix(suffix:str) -> bool:
+    # loading the mimetypes tables is not free, only do it when files are actually scanned
+    import mimetypes
+    mime_type, _ = mimetypes.guess_type(f"x{suffix}")
+    return bool(mime_type and mime_type.startswith('text'))
+
 def is_text_file(file_path):
-    mime_type, _ = mimetypes.guess_type(file_path)
-    return mime_type and mime_type.startswith('text')
+    return _is_text_suffix(os.path.splitext(file_path)[1].lower())
+
+@lru_cache(maxsize=None)
+def compile_pattern(pattern:str) -> re.Pattern:
+    return re.compile(pattern.encode())
 
-def find_strings_in_files(folder_path:str, pattern:str,name_only=False,verbose=False):
+def scan_file(file_path:str, regex:re.Pattern, name_only=False, verbose=False) -> list:
+    """
+    Match a compiled bytes pattern against the whole file through mmap,
+    line numbers are only counted when they are asked for
+    """
     matches = []
+    with open(file_path, 'rb') as f:
+        # empty files can't be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return matches
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            line_number, counted = 1, 0
+            for match in regex.finditer(mm):
+                mg = match.group().decode('utf-8', errors='replace')
+                if verbose and mg:
+                    print(f"In file {file_path} ,{mg} are found")
+                if name_only:
+                    matches.append(mg)
+                else:
+                    line_number += mm[counted:match.start()].count(b"\n")
+                    counted = match.start()
+                    matches.append((mg, file_path, line_number))
+    return matches
 
+def iter_text_files(folder_path:str):
     for root, dirs, files in os.walk(folder_path):
         for file in files:
             file_path = os.path.join(root, file)
+            if is_text_file(file_path):
+                yield file_path
 
-            if not is_text_file(file_path):
-                continue
-            if verbose:
-                print(f"Searching {file_path}")
+def scan_files(file_paths, pattern:str, name_only=False, verbose=False, jobs:int=1) -> set:
+    """
+    Match `pattern` in every given file, `jobs` > 1 reads the files from a thread pool
+    """
+    regex = compile_pattern(pattern)
+    matches = set()
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+    def scan(file_path):
+        if verbose:
+            print(f"Searching {file_path}")
+        return scan_file(file_path, regex, name_only, verbose)
 
-                for line_number, line in enumerate(lines, 1):
-                    for match in re.finditer(rf'{pattern}', line):
-                        mg = match.group()
-                        if verbose and mg:
-                            print(f"In file {file_path} ,{mg} are found")
-                        if name_only:
-                            matches.append(match.group())
-                        else:
-                            matches.append((match.group(), file_path, line_number))
+    if jobs > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for found in pool.map(scan, file_paths):
+                matches.update(found)
+    else:
+        for file_path in file_paths:
+            matches.update(scan(file_path))
+    return matches
 
-    return set(matches)
+def index_files(file_paths, pattern:str, name_only=True, verbose=False, jobs:int=1) -> Dict[str,set]:
+    """
+    Like scan_files but keep the matches of each file apart, used to update results incrementally
+    """
+    regex = compile_pattern(pattern)
+    file_paths = list(file_paths)
+
+    def scan(file_path):
+        if verbose:
+            print(f"Searching {file_path}")
+        return set(scan_file(file_path, regex, name_only, verbose))
+
+    if jobs > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            return dict(zip(file_paths, pool.map(scan, file_paths)))
+    return {file_path: scan(file_path) for file_path in file_paths}
+
+def find_strings_in_files(folder_path:str, pattern:str,name_only=False,verbose=False,jobs:int=1):
+    return scan_files(iter_text_files(folder_path), pattern, name_only, verbose, jobs)
 
 def parse_css_file(css_file_path:str) -> CSSCompat:
     with open(css_file_path, "r") as file:
         raw_string = file.read()
+    return parse_css(raw_string)
 
+def parse_css(raw_string:str) -> CSSCompat:
     comment_pattern = r"\/\*[\s\S]*?\*\/"
     comment_matches = re.findall(comment_pattern, raw_string, re.DOTALL)
 
@@ -57,6 +127,96 @@ def parse_css_file(css_file_path:str) -> CSSCompat:
 
     return CSSCompat(comments=comment_matches,fontfaces=fontface_matches,ti_classes=ti_classes)
 
+def load_css_index(css_file_path:str, index_dir:str=CSS_INDEX_DIR, verbose=False) -> CSSCompat:
+    """
+    parse_css_file backed by an on-disk index keyed on the hash of the css,
+    only the first run on a given tabler-icons.min.css pays for the regexes
+    """
+    import hashlib
+    import pickle
+
+    with open(css_file_path, "rb") as file:
+        raw = file.read()
+    index_path = os.path.join(index_dir, f"{hashlib.sha256(raw).hexdigest()}.pickle")
+    try:
+        with open(index_path, "rb") as f:
+            css_compat = pickle.load(f)
+        if isinstance(css_compat, CSSCompat):
+            if verbose:
+                print(f"CSS index loaded from {index_path}")
+            return css_compat
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    css_compat = parse_css(raw.decode("utf-8"))
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        tmp = f"{index_path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(css_compat, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, index_path)
+        if verbose:
+            print(f"CSS index written to {index_path}")
+    except OSError as e:
+        print(f"Failed to write CSS index, {e}")
+    return css_compat
+
+def icon_codepoints(css_compat:CSSCompat, include_classes) -> List[int]:
+    """
+    Codepoints of the icon glyphs, read from the `content:"\\xxxx"` of each class
+    """
+    codepoints = []
+    for ic in include_classes:
+        m = re.search(r'content:\s*["\']\\([0-9a-fA-F]+)["\']', css_compat.icon(ic) or "")
+        if m:
+            codepoints.append(int(m.group(1), 16))
+    return codepoints
+
+def fontface_url(fontface:str, fmt:str="woff2") -> Optional[str]:
+    m = re.search(rf'url\(\s*["\']?([^"\')]+?)["\']?\s*\)\s*format\(\s*["\']{fmt}["\']\s*\)', fontface)
+    return m.group(1) if m else None
+
+def rewrite_fontface(fontface:str, font_url:str) -> str:
+    """
+    Point the src of an @font-face at a single woff2 file
+    """
+    return re.sub(r'src:[^;}]*', f'src:url("{font_url}") format("woff2")', fontface, count=1)
+
+def subset_font(font_path:str, out_font_path:str, codepoints:List[int], verbose=False) -> None:
+    """
+    Keep only `codepoints` in the font and save it as woff2, needs fontTools (and brotli for woff2)
+    """
+    try:
+        from fontTools import subset
+    except ImportError as ie:
+        raise RuntimeError(f"Failed to import module, {ie}. Install fonttools and brotli to subset fonts.")
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    options.notdef_outline = True
+    font = subset.load_font(font_path, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    os.makedirs(os.path.dirname(out_font_path) or ".", exist_ok=True)
+    subset.save_font(font, out_font_path, options)
+    if verbose:
+        print(f"Subset font with {len(codepoints)} glyphs written to {out_font_path}")
+
+def subset_icon_font(css_compat:CSSCompat, in_css_path:str, out_css_path:str, out_font_path:str, include_classes, verbose=False) -> str:
+    """
+    Subset the tabler webfont referenced by `in_css_path` to the included icons.
+    Return the url of the subset font relative to `out_css_path`, for rewrite_fontface.
+    """
+    src_url = fontface_url(css_compat.fontfaces[0])
+    if src_url is None:
+        raise RuntimeError("No woff2 source found in @font-face")
+    # drop the ?v=... cache buster
+    font_path = os.path.join(os.path.dirname(in_css_path), src_url.split("?")[0].split("#")[0])
+    subset_font(font_path, out_font_path, icon_codepoints(css_compat, include_classes), verbose)
+    return os.path.relpath(out_font_path, os.path.dirname(out_css_path) or ".").replace(os.sep, "/")
+
 def generate_css_file(css_compat:CSSCompat, output_file_path:str,verbose:bool=False):
     try:
         with open(output_file_path, "w",encoding="utf-8") as f:
@@ -79,22 +239,28 @@ def generate_css_file(css_compat:CSSCompat, output_file_path:str,verbose:bool=Fa
     except Exception as e:
         print("Error:", e)
 
-def minify_css(in_css_path:str,out_css_path:str,include_classes=[],verbose=False) -> CSSCompat:
-    origin_css = parse_css_file(in_css_path)
+def minify_css(in_css_path:str,out_css_path:str,include_classes=[],verbose=False,origin_css:CSSCompat=None,font_url:str=None) -> CSSCompat:
+    if origin_css is None:
+        origin_css = load_css_index(in_css_path, verbose=verbose)
 
     new_prop = {}
 
     for ic in include_classes:
         class_name = f".{ic}:before"
-        t = origin_css.ti_classes.get(class_name)
+        t = origin_css.icon(ic)
         if verbose:
             print(f"for {class_name}: {t!r}")
 
         new_prop[class_name] = t
     new_prop[".ti"] = origin_css.ti_classes.get(".ti")
 
-    new_css = CSSCompat(comments=origin_css.comments,fontfaces=origin_css.fontfaces,ti_classes=new_prop)
-    print(new_css)
+    fontfaces = origin_css.fontfaces
+    if font_url is not None:
+        fontfaces = [rewrite_fontface(fontfaces[0], font_url)] + fontfaces[1:]
+
+    new_css = CSSCompat(comments=origin_css.comments,fontfaces=fontfaces,ti_classes=new_prop)
+    if verbose:
+        print(new_css)
     generate_css_file(new_css,out_css_path,verbose)
 
     return new_css
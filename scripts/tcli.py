@@ -1,16 +1,20 @@
 from typing_extensions import Annotated
-from tablertrimer import *
 from typing import List
 from pathlib import Path
-import time
 import typer
-import json
 
-app = typer.Typer()
+# tablertrimer, the watcher and instrumentation are imported by the commands needing them so that
+# `--help` stays cheap; plain click help avoids loading rich
+app = typer.Typer(rich_markup_mode=None)
 state = {"verbose": False}
 
 @app.callback()
-def main(verbose: Annotated[bool ,typer.Option("-v","--verbose",help="Verbose output")]= False):
+def main(ctx: typer.Context,
+         verbose: Annotated[bool ,typer.Option("-v","--verbose",help="Verbose output")]= False,
+         timings: Annotated[bool ,typer.Option("--timings",help="Print how long each stage took")]= False,
+         trace: Annotated[Path ,typer.Option("--trace",help="Write the stage timings as a Chrome trace json")]= None,
+         profile: Annotated[Path ,typer.Option("--profile",help="Run under cProfile and dump the stats here")]= None,
+         ):
     """
     tcli is a CLI wrapper for tablertrimer, use `python tcli.py [COMMAND] --help"
     to get further information
@@ -18,6 +22,15 @@ def main(verbose: Annotated[bool ,typer.Option("-v","--verbose",help="Verbose ou
     if verbose:
         print("Will write verbose output")
         state["verbose"] = True
+    if profile:
+        from instrument import start_profiler
+        ctx.call_on_close(start_profiler(str(profile)))
+    if timings or trace:
+        from instrument import RECORDER
+    if timings:
+        ctx.call_on_close(RECORDER.report)
+    if trace:
+        ctx.call_on_close(lambda: RECORDER.write_trace(str(trace)))
 
 @app.command(help="Minify the tabler.min.css")
 def trim(
@@ -33,56 +46,96 @@ def trim(
             help="Export the info for compiling tabler icon fonts."
         )] = None,
         watch_interval:Annotated[float,typer.Option("-w","--watch",
-                                               help="Watch files in paths, synchronize ticlass changes at intervals(seconds).",
+                                               help="Watch files in paths and synchronize ticlass changes, polls at this interval(seconds) where inotify is unavailable.",
                                                )] = -1,
+        jobs:Annotated[int,typer.Option("-j","--jobs",
+                                        help="Number of files to scan at once.",
+                                        )] = 1,
+        subset_font_path:Annotated[Path,typer.Option("-s","--subset_font",
+                                        help="Write a woff2 holding only the used icons here and point the css at it (needs fonttools).",
+                                        )] = None,
     ):
+    import json
+    import os
+    from instrument import stage
+    from tablertrimer import index_files, is_text_file, iter_text_files, load_css_index, minify_css, subset_icon_font
+
     pattern=r"ti ti(-\w+)*"
-    old_l = []
-    compile_options = {
-        "includeIcons":[]
-    }
-    if watch_interval > 0:
-        typer.echo(f"Start to watch on {paths}")
-    while True:
-        l = []
+    verbose = state["verbose"]
+    # parsed once, watch mode refreshes reuse it
+    with stage("load css index", "css index", path=input_path):
+        origin_css = load_css_index(input_path, verbose=verbose)
 
-        for path in paths:
-            l+=find_strings_in_files(path,pattern,name_only=True,verbose=state["verbose"])
+    def sync(classes, old_classes):
+        font_url = None
+        if subset_font_path:
+            try:
+                with stage("font subset", "subset"):
+                    font_url = subset_icon_font(origin_css,str(input_path),str(output_path),str(subset_font_path),sorted(classes),verbose)
+                typer.echo(f"Subset font for {len(classes)} classes written to {subset_font_path}")
+            except (RuntimeError, OSError) as e:
+                typer.echo(f"Failed to subset font, keeping the full one. {e}")
+        with stage("minify css", "minify"):
+            minify_css(input_path,output_path,sorted(classes),verbose=verbose,origin_css=origin_css,font_url=font_url)
+        typer.echo(f"These new classes {sorted(classes - old_classes)} are synced to {output_path}")
+        if output_font_compile_options:
+            compile_options = {
+                "includeIcons":[code[3:] for code in sorted(classes)] # remove ti- prefix
+            }
+            typer.echo(f"Compile options: {compile_options} generate at {output_font_compile_options}")
+            with open(output_font_compile_options,'w') as jsonfd:
+                json.dump(compile_options,jsonfd)
 
+    def classes_of(matches):
         # reshape and remove ti
-        l = [i.split(" ")[1] for i in l]
-        if state["verbose"]:
-            print(l)
+        return {i.split(" ")[1] for i in matches}
+
+    # icon classes used by each file, the watcher only rescans the files that changed
+    icons_by_file = {}
+    for path in paths:
+        with stage("css scan", "scan", path=path):
+            icons_by_file.update(index_files(iter_text_files(path),pattern,verbose=verbose,jobs=jobs))
+    classes = classes_of(set().union(*icons_by_file.values()))
+    if verbose:
+        print(sorted(classes))
+    sync(classes, set())
+
+    if watch_interval <= 0:
+        return
 
-        if l != old_l:
-            new_css_meta = minify_css(input_path,output_path,l,verbose=state["verbose"])
-            typer.echo(f"These new classes {[x for x in l if not x in old_l]} are synced to {output_path}")
-            compile_options["includeIcons"] =[code[3:] for code in l] # remove ti- prefix
-            if output_font_compile_options:
-                typer.echo(f"Compile options: {compile_options} generate at {output_font_compile_options}")
-                with open(output_font_compile_options,'w') as jsonfd:
-                    json.dump(compile_options,jsonfd)
-            old_l = l
+    from watcher import open_watcher
+    typer.echo(f"Start to watch on {paths}")
+    with open_watcher(paths, interval=watch_interval, verbose=verbose) as watcher:
+        while True:
+            changed = watcher.changes()
+            alive = [f for f in changed if os.path.isfile(f) and is_text_file(f)]
+            for f in changed.difference(alive):
+                icons_by_file.pop(f, None)
+            with stage("css rescan", "scan", files=len(alive)):
+                icons_by_file.update(index_files(alive,pattern,verbose=verbose))
 
-        if watch_interval < 0:
-            break
-        else:
-            old_l = l
-            time.sleep(watch_interval)
+            new_classes = classes_of(set().union(*icons_by_file.values()))
+            if new_classes != classes:
+                sync(new_classes, classes)
+                classes = new_classes
 
 @app.command(help="For debug, try to match All tabler class")
 def match(
         paths: Annotated[List[Path], typer.Argument(help="Path of the to-be-match floder, can be mutiple floder")],
         name_only: Annotated[bool,typer.Option("-n","--name_only",
                                                help="whether to show where the match group are founded",
-                                               )] = False
+                                               )] = False,
+        jobs:Annotated[int,typer.Option("-j","--jobs",
+                                        help="Number of files to scan at once.",
+                                        )] = 1,
         ):
+    from tablertrimer import find_strings_in_files
     if paths == []:
         paths = ['./']
     pattern=r"ti ti(-\w+)*"
     for path in paths:
         typer.echo(f"Matching under {path}")
-        m = find_strings_in_files(path,pattern,name_only,state["verbose"])
+        m = find_strings_in_files(path,pattern,name_only,state["verbose"],jobs)
         typer.echo(m)
 
 if __name__ == '__main__':
@@ -0,0 +1,182 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# inotify(7) constants
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+class PollingWatcher():
+    """
+    Fallback watcher, stats every file under the watched paths each `interval` seconds
+    """
+    def __init__(self, paths: Iterable[str], interval: float = 1.0, debounce: float = 0.05):
+        self.paths = [str(p) for p in paths]
+        self.interval = interval
+        self.snapshot = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for path in self.paths:
+            files = [path] if os.path.isfile(path) else (os.path.join(root, f) for root, _, fs in os.walk(path) for f in fs)
+            for f in files:
+                try:
+                    st = os.stat(f)
+                except OSError:
+                    continue
+                snapshot[f] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def changes(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Block until some files changed (or `timeout` passed) and return their paths, deleted files included
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+            snapshot = self._snapshot()
+            changed = {f for f in snapshot.keys() | self.snapshot.keys() if snapshot.get(f) != self.snapshot.get(f)}
+            self.snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class InotifyWatcher():
+    """
+    Linux watcher on top of inotify, idles in select() until the kernel reports a change.
+    Bursts of events (e.g. an editor's save) are merged when they arrive within `debounce` seconds.
+    """
+    def __init__(self, paths: Iterable[str], interval: float = 1.0, debounce: float = 0.05):
+        self.libc = load_libc()
+        self.debounce = debounce
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, str] = {}
+        # watched single files, inotify watches their parent dir
+        self.files: Dict[str, Set[str]] = {}
+        for path in paths:
+            path = str(path)
+            if os.path.isdir(path):
+                self._add_tree(path)
+            else:
+                parent = os.path.dirname(path) or "."
+                self._add_dir(parent)
+                self.files.setdefault(parent, set()).add(path)
+
+    def _add_dir(self, path: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self.dirs[wd] = path
+
+    def _add_tree(self, path: str) -> Set[str]:
+        """
+        Watch `path` and every dir below it, return the files already in there
+        """
+        found = set()
+        for root, _, files in os.walk(path):
+            self._add_dir(root)
+            found.update(os.path.join(root, f) for f in files)
+        return found
+
+    def _read(self, timeout: Optional[float]) -> Optional[Set[str]]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return None
+        changed = set()
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, size = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + size].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + size
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, report everything we know of
+                changed.update(os.path.join(root, f) for d in list(self.dirs.values()) for root, _, fs in os.walk(d) for f in fs)
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            parent = self.dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and parent not in self.files:
+                    changed.update(self._add_tree(path))
+                continue
+            if parent in self.files and path not in self.files[parent]:
+                continue
+            changed.add(path)
+        return changed
+
+    def changes(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Block until some files changed (or `timeout` passed) and return their paths, deleted files included
+        """
+        changed = self._read(timeout)
+        if changed is None:
+            return set()
+        while True:
+            more = self._read(self.debounce)
+            if more is None:
+                return changed
+            changed |= more
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+def open_watcher(paths: Iterable[str], interval: float = 1.0, debounce: float = 0.05, verbose=False):
+    """
+    inotify where the platform has it, stat polling every `interval` seconds otherwise
+    """
+    paths = list(paths)
+    try:
+        return InotifyWatcher(paths, interval, debounce)
+    except (OSError, AttributeError) as e:
+        if verbose:
+            print(f"[Watcher] inotify unavailable ({e}), polling every {interval}s")
+        return PollingWatcher(paths, interval, debounce)